@@ -0,0 +1,76 @@
+"""
+Wake-up latency of the file waits: time between a file creation and the waiter noticing it
+
+Usage:
+python -m benchmarks.fswatch --trials 20 --retry-ms 500
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List
+
+from deskapptest.utils import fswatch
+from deskapptest.utils.wait import WaitPolicy, pollwait
+
+
+def run(
+    backend: str, *, trials: int = 20, retry_ms: int = 500, seed: int = 0
+) -> Dict[str, float]:
+    rnd = random.Random(seed)
+    latencies: List[float] = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for i in range(trials):
+            path = os.path.join(tmp, f"{i}.txt")
+            created = []
+
+            def create(delay: float):
+                time.sleep(delay)
+                created.append(time.perf_counter())
+                with open(path, "w") as f:
+                    f.write("done")
+
+            writer = threading.Thread(target=create, args=(rnd.uniform(0.05, 0.3),))
+            with fswatch.watch(tmp, backend=backend) as watcher:
+                writer.start()
+                assert pollwait(
+                    lambda: os.path.exists(path),
+                    wait_ms=10000,
+                    policy=WaitPolicy(retry_ms),
+                    sleep=watcher.wait,
+                )
+                noticed = time.perf_counter()
+            writer.join()
+            latencies.append((noticed - created[0]) * 1000)
+    return {
+        "median_ms": statistics.median(latencies),
+        "p95_ms": sorted(latencies)[int(len(latencies) * 0.95) - 1],
+        "max_ms": max(latencies),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--backends", nargs="+", default=[fswatch.INOTIFY, fswatch.POLLING]
+    )
+    parser.add_argument("--trials", type=int, default=20)
+    parser.add_argument("--retry-ms", type=int, default=500)
+    args = parser.parse_args(argv)
+
+    print(f"{'backend':<10} {'median ms':>10} {'p95 ms':>10} {'max ms':>10}")
+    for backend in args.backends:
+        r = run(backend, trials=args.trials, retry_ms=args.retry_ms)
+        print(
+            f"{backend:<10} {r['median_ms']:>10.2f} {r['p95_ms']:>10.2f} {r['max_ms']:>10.2f}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,84 @@
+"""
+Import time regression benchmark for deskapptest modules
+
+Usage:
+python -m benchmarks.importtime --budget-ms 150 deskapptest.apps.base
+"""
+
+import argparse
+import re
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+DEFAULT_MODULES = ["deskapptest.apps.base", "deskapptest.utils.fs"]
+DEFAULT_BUDGET_MS = 150
+# Backends which must be loaded lazily on the first use only
+HEAVY_MODULES = ["numpy", "cv2", "PIL", "airtest", "pywinauto", "pyautogui"]
+
+_LINE_RE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s+)(\S+)")
+
+
+def _importtime(module: str) -> Tuple[Dict[str, Tuple[int, int]], List[str]]:
+    """
+    Import the module in a fresh interpreter, return {module: (self us, cumulative us)} and loaded heavy modules
+    """
+    code = (
+        f"import sys, {module}; "
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in proc.stderr.splitlines():
+        m = _LINE_RE.match(line)
+        if m:
+            times[m.group(4)] = (int(m.group(1)), int(m.group(2)))
+    heavy = [m for m in proc.stdout.strip().split(",") if m]
+    return times, heavy
+
+
+def measure(
+    module: str, *, repeat: int = 5
+) -> Tuple[float, List[str], List[Tuple[str, int]]]:
+    """
+    Return median cumulative import time in ms, loaded heavy modules and the slowest imports by self time
+    """
+    _importtime(module)  # Warm up bytecode cache
+    cumulative = []
+    for _ in range(repeat):
+        times, heavy = _importtime(module)
+        cumulative.append(times[module][1] / 1000)
+    slowest = sorted(
+        ((name, t[0]) for name, t in times.items()), key=lambda i: i[1], reverse=True
+    )[:10]
+    return statistics.median(cumulative), heavy, slowest
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES)
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    failed = False
+    for module in args.modules:
+        median_ms, heavy, slowest = measure(module, repeat=args.repeat)
+        status = "OK" if median_ms <= args.budget_ms and not heavy else "FAIL"
+        failed = failed or status == "FAIL"
+        print(f"{status} {module}: {median_ms:.1f} ms (budget {args.budget_ms} ms)")
+        if heavy:
+            print(f"  eagerly imported heavy modules: {', '.join(heavy)}")
+        for name, self_us in slowest:
+            print(f"  {self_us / 1000:8.2f} ms  {name}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,377 @@
+"""
+Latency, memory and accuracy of find_template/find_all_templates on synthetic desktops, no display needed
+
+Each run covers every resolution x cvstrategy x threshold. The screens get pixel noise, and the templates
+are recorded at a jittered scale (as with another DPI) and must be rescaled by the template resolution.
+Results are saved as JSON. Compare the results of two versions to catch regressions:
+
+Usage:
+python -m benchmarks.pipeline --out before.json
+python -m benchmarks.pipeline --out after.json --compare before.json
+"""
+
+import argparse
+import json
+import logging
+import math
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Dict, List, Optional as Opt, Tuple
+
+import cv2
+from airtest.core.error import TargetNotFoundError
+
+from benchmarks import synthetic
+from deskapptest.apps import base
+from deskapptest.utils import frames, metrics, tplcache
+from deskapptest.utils.backends import settings as _settings
+
+# Max distance in pixels between the found and the expected template center
+TOLERANCE_PX = 3
+# Stages reported from the metrics histograms
+STAGES = (
+    "frames.grab",
+    "tplcache.decode",
+    "matching.match_in",
+    "matching.match_all_in",
+)
+FINDS = ("find_template", "find_all_templates")
+# Result key paths compared between the runs: (path, higher is better)
+COMPARED = (
+    *(((find, ms), False) for find in FINDS for ms in ("p50_ms", "p95_ms")),
+    # Stage means are exact, the histogram percentiles are power-of-two bucket bounds
+    *(
+        ((find, "stages", stage, "mean_ms"), False)
+        for find in FINDS
+        for stage in STAGES
+    ),
+    (("peak_mb",), False),
+    *(((find, score), True) for find in FINDS for score in ("precision", "recall")),
+)
+
+
+class _Case:
+    """
+    Desktop with the templates cut from it and the expected centers of each template
+    """
+
+    def __init__(
+        self,
+        tmp: str,
+        resolution: Tuple[int, int],
+        seed: int,
+        *,
+        templates: int,
+        negatives: int,
+        noise: float,
+        scale_jitter: float,
+    ):
+        from airtest.core.cv import Template
+
+        width, height = resolution
+        rnd = random.Random(seed)
+        desktop = synthetic.make_desktop(width, height, seed=seed)
+        # Every other template has a second copy on the screen
+        for i in range(0, templates, 2):
+            desktop = synthetic.embed_copy(desktop, i, seed=seed + i)
+        # Templates of a desktop with other labels are not on the screen
+        other = synthetic.make_desktop(width, height, seed=seed + 10_000)
+
+        self.templates: List[Tuple[Any, List[Tuple[int, int]]]] = []
+        for i, source in [(i, desktop) for i in range(templates)] + [
+            (i, other) for i in range(negatives)
+        ]:
+            scale = 1 + rnd.uniform(-scale_jitter, scale_jitter)
+            path = os.path.join(tmp, f"{seed}_{len(self.templates)}.png")
+            cv2.imwrite(path, synthetic.cut_template(source, i, scale=scale))
+            template = Template(
+                path,
+                resolution=(round(width * scale), round(height * scale)),
+            )
+            label = source.widgets[i].label
+            expected = (
+                [w.center for w in desktop.widgets if w.label == label]
+                if source is desktop
+                else []
+            )
+            self.templates.append((template, expected))
+        self.screen = synthetic.add_noise(desktop.screen, noise, seed=seed)
+
+
+def _near(pos: Tuple[int, int], expected: Tuple[int, int]) -> bool:
+    return all(abs(a - b) <= TOLERANCE_PX for a, b in zip(pos, expected))
+
+
+def _score(found: List[Tuple[int, int]], expected: List[Tuple[int, int]]):
+    """
+    (true positives, false positives, false negatives), each expected center is matched once
+    """
+    left = list(expected)
+    tp = fp = 0
+    for pos in found:
+        hit = next((e for e in left if _near(pos, e)), None)
+        if hit is None:
+            fp += 1
+        else:
+            left.remove(hit)
+            tp += 1
+    return tp, fp, len(left)
+
+
+def _one_of(
+    found: List[Tuple[int, int]], expected: List[Tuple[int, int]]
+) -> List[Tuple[int, int]]:
+    """
+    Single expected center for find_template, the found one if the template has several copies
+    """
+    if not expected:
+        return []
+    hit = next((e for e in expected if found and _near(found[0], e)), expected[0])
+    return [hit]
+
+
+def _summary(latencies: List[float], tp: int, fp: int, fn: int) -> Dict[str, float]:
+    return {
+        "p50_ms": statistics.median(latencies),
+        # Nearest rank
+        "p95_ms": sorted(latencies)[max(0, math.ceil(len(latencies) * 0.95) - 1)],
+        "precision": tp / (tp + fp) if tp + fp else 1.0,
+        "recall": tp / (tp + fn) if tp + fn else 1.0,
+    }
+
+
+def _find_template(template) -> List[Tuple[int, int]]:
+    try:
+        return [base.find_template(template, wait_ms=0)]
+    except TargetNotFoundError:
+        return []
+
+
+def _find_all_templates(template) -> List[Tuple[int, int]]:
+    return [m["result"] for m in base.find_all_templates(template, wait_ms=0)]
+
+
+def run(
+    resolution: str,
+    strategy: str,
+    threshold: float,
+    *,
+    screens: int = 2,
+    templates: int = 8,
+    negatives: int = 4,
+    noise: float = 4.0,
+    scale_jitter: float = 0.1,
+) -> Dict[str, Any]:
+    size = synthetic.RESOLUTIONS[resolution]
+    Settings = _settings.Settings
+    prev_settings = Settings.CVSTRATEGY, Settings.THRESHOLD
+    Settings.CVSTRATEGY, Settings.THRESHOLD = [strategy], threshold
+    prev_metrics = metrics.is_enabled()
+    result: Dict[str, Any] = {
+        "resolution": resolution,
+        "strategy": strategy,
+        "threshold": threshold,
+    }
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            cases = [
+                _Case(
+                    tmp,
+                    size,
+                    seed,
+                    templates=templates,
+                    negatives=negatives,
+                    noise=noise,
+                    scale_jitter=scale_jitter,
+                )
+                for seed in range(screens)
+            ]
+            tplcache.get_cache().clear()
+            metrics.enable()
+            for name, find in zip(FINDS, (_find_template, _find_all_templates)):
+                # Stages of each function are reported separately
+                metrics.reset()
+                latencies: List[float] = []
+                tp = fp = fn = 0
+                for case in cases:
+                    prev_source = frames.set_source(frames.ArraySource(case.screen))
+                    try:
+                        for template, expected in case.templates:
+                            start = time.perf_counter()
+                            found = find(template)
+                            latencies.append((time.perf_counter() - start) * 1000)
+                            if name == "find_template":
+                                expected = _one_of(found, expected)
+                            scores = _score(found, expected)
+                            tp, fp, fn = tp + scores[0], fp + scores[1], fn + scores[2]
+                    finally:
+                        frames.set_source(prev_source)
+                result[name] = _summary(latencies, tp, fp, fn)
+                result[name]["stages"] = {
+                    stage: {
+                        k: h[k]
+                        for k in ("count", "mean_ms", "p50_ms", "p95_ms", "total_ms")
+                    }
+                    for stage, h in metrics.histograms().items()
+                    if stage in STAGES
+                }
+            metrics.enable(prev_metrics)
+
+            # Memory is measured in a separate pass, tracing slows the allocations down
+            tplcache.get_cache().clear()
+            tracemalloc.start()
+            for case in cases:
+                prev_source = frames.set_source(frames.ArraySource(case.screen))
+                try:
+                    for template, _ in case.templates:
+                        _find_template(template)
+                finally:
+                    frames.set_source(prev_source)
+            result["peak_mb"] = tracemalloc.get_traced_memory()[1] / 2**20
+            tracemalloc.stop()
+    finally:
+        Settings.CVSTRATEGY, Settings.THRESHOLD = prev_settings
+        metrics.enable(prev_metrics)
+    return result
+
+
+def _meta(args: argparse.Namespace) -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "opencv": cv2.__version__,
+        "params": vars(args),
+    }
+
+
+def _key(r: Dict[str, Any]) -> Tuple[str, str, float]:
+    return r["resolution"], r["strategy"], r["threshold"]
+
+
+def _get(r: Dict[str, Any], path: Tuple[str, ...]) -> Opt[float]:
+    # Stage names contain dots, so the keys are paths
+    for part in path:
+        r = r.get(part) if isinstance(r, dict) else None
+    return r
+
+
+def compare(
+    results: List[Dict[str, Any]],
+    baseline: List[Dict[str, Any]],
+    *,
+    max_slowdown: float,
+    max_accuracy_drop: float,
+) -> List[str]:
+    """
+    Regressions of the results against the baseline ones with the same resolution, strategy and threshold
+    """
+    base_by_key = {_key(r): r for r in baseline}
+    regressions = []
+    for r in results:
+        prev = base_by_key.get(_key(r))
+        if prev is None:
+            continue
+        for path, higher_better in COMPARED:
+            key = "/".join(path)
+            new, old = _get(r, path), _get(prev, path)
+            if new is None or old is None:
+                continue
+            if higher_better:
+                regressed = old - new > max_accuracy_drop
+            else:
+                regressed = old > 0 and (new - old) / old > max_slowdown
+            if regressed:
+                regressions.append(f"{_key(r)} {key}: {old:.3f} -> {new:.3f}")
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--resolutions",
+        nargs="+",
+        default=list(synthetic.RESOLUTIONS),
+        choices=list(synthetic.RESOLUTIONS),
+    )
+    parser.add_argument("--strategies", nargs="+", default=["tpl", "pyramid"])
+    parser.add_argument("--thresholds", nargs="+", type=float, default=[0.7, 0.9])
+    parser.add_argument("--screens", type=int, default=2)
+    parser.add_argument("--templates", type=int, default=8)
+    parser.add_argument("--negatives", type=int, default=4)
+    parser.add_argument("--noise", type=float, default=4.0, help="Pixel noise sigma")
+    parser.add_argument(
+        "--scale-jitter", type=float, default=0.1, help="Max relative template scale"
+    )
+    parser.add_argument("--out", help="Save the results JSON")
+    parser.add_argument("--compare", help="Baseline results JSON")
+    parser.add_argument("--max-slowdown", type=float, default=0.2)
+    parser.add_argument("--max-accuracy-drop", type=float, default=0.02)
+    args = parser.parse_args(argv)
+    # airtest debug logs of every match would flood the table
+    logging.disable(logging.INFO)
+
+    results = []
+    print(
+        f"{'resolution':<10} {'strategy':<8} {'thr':>4} {'find ms':>8} {'all ms':>8} "
+        f"{'peak MB':>8} {'prec':>6} {'recall':>6} {'all prec':>8} {'all rec':>7}"
+    )
+    for resolution in args.resolutions:
+        for strategy in args.strategies:
+            for threshold in args.thresholds:
+                r = run(
+                    resolution,
+                    strategy,
+                    threshold,
+                    screens=args.screens,
+                    templates=args.templates,
+                    negatives=args.negatives,
+                    noise=args.noise,
+                    scale_jitter=args.scale_jitter,
+                )
+                results.append(r)
+                one, all_ = r["find_template"], r["find_all_templates"]
+                print(
+                    f"{resolution:<10} {strategy:<8} {threshold:>4} {one['p50_ms']:>8.1f} "
+                    f"{all_['p50_ms']:>8.1f} {r['peak_mb']:>8.1f} {one['precision']:>6.2f} "
+                    f"{one['recall']:>6.2f} {all_['precision']:>8.2f} {all_['recall']:>7.2f}"
+                )
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"meta": _meta(args), "results": results}, f, indent=1)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(
+            results,
+            baseline,
+            max_slowdown=args.max_slowdown,
+            max_accuracy_drop=args.max_accuracy_drop,
+        )
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,112 @@
+"""
+Accuracy and latency of the template matching strategies on synthetic desktops
+
+Usage:
+python -m benchmarks.strategies --resolution 1080p --strategies tpl pyramid
+"""
+
+import argparse
+import math
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+import cv2
+
+from benchmarks import synthetic
+from deskapptest.utils import matching
+from deskapptest.utils.backends import settings as _settings
+
+# Max distance in pixels between the found and the expected template center
+TOLERANCE_PX = 2
+
+
+def run(
+    strategy: str,
+    *,
+    resolution: str = "1080p",
+    screens: int = 3,
+    templates: int = 10,
+    threshold: float = 0.8,
+    noise: float = 4.0,
+    scale_jitter: float = 0.1,
+) -> Dict[str, float]:
+    from airtest.core.cv import Template
+
+    width, height = synthetic.RESOLUTIONS[resolution]
+    rnd = random.Random(0)
+    Settings = _settings.Settings
+    prev_strategy = Settings.CVSTRATEGY
+    Settings.CVSTRATEGY = [strategy]
+    latencies: List[float] = []
+    hits = 0
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            for seed in range(screens):
+                desktop = synthetic.make_desktop(width, height, seed=seed)
+                # Templates are cut from the clean desktop and searched on the noisy screen
+                screen = synthetic.add_noise(desktop.screen, noise, seed=seed)
+                for i in range(templates):
+                    scale = 1 + rnd.uniform(-scale_jitter, scale_jitter)
+                    path = os.path.join(tmp, f"{seed}_{i}.png")
+                    cv2.imwrite(path, synthetic.cut_template(desktop, i, scale=scale))
+                    template = Template(
+                        path,
+                        threshold=threshold,
+                        resolution=(round(width * scale), round(height * scale)),
+                    )
+                    matching.match_in(template, screen)  # Warm up the template cache
+                    start = time.perf_counter()
+                    pos = matching.match_in(template, screen)
+                    latencies.append((time.perf_counter() - start) * 1000)
+                    expected = desktop.widgets[i].center
+                    if pos and all(
+                        abs(a - b) <= TOLERANCE_PX for a, b in zip(pos, expected)
+                    ):
+                        hits += 1
+    finally:
+        Settings.CVSTRATEGY = prev_strategy
+    return {
+        "median_ms": statistics.median(latencies),
+        # Nearest rank
+        "p95_ms": sorted(latencies)[max(0, math.ceil(len(latencies) * 0.95) - 1)],
+        "accuracy": hits / len(latencies),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--resolution", default="1080p", choices=list(synthetic.RESOLUTIONS)
+    )
+    parser.add_argument("--strategies", nargs="+", default=["tpl", "pyramid"])
+    parser.add_argument("--screens", type=int, default=3)
+    parser.add_argument("--templates", type=int, default=10)
+    parser.add_argument("--noise", type=float, default=4.0, help="Pixel noise sigma")
+    parser.add_argument(
+        "--scale-jitter", type=float, default=0.1, help="Max relative template scale"
+    )
+    args = parser.parse_args(argv)
+
+    print(f"{'strategy':<10} {'median ms':>10} {'p95 ms':>10} {'accuracy':>9}")
+    for strategy in args.strategies:
+        r = run(
+            strategy,
+            resolution=args.resolution,
+            screens=args.screens,
+            templates=args.templates,
+            noise=args.noise,
+            scale_jitter=args.scale_jitter,
+        )
+        print(
+            f"{strategy:<10} {r['median_ms']:>10.1f} {r['p95_ms']:>10.1f} {r['accuracy']:>9.2%}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,163 @@
+"""
+Synthetic desktops with UI-like widgets for headless template matching benchmarks
+"""
+
+import random
+import string
+from typing import List, NamedTuple, Tuple
+
+import cv2
+import numpy as np
+
+from deskapptest.utils.frames import Rect
+
+RESOLUTIONS = {
+    "1080p": (1920, 1080),
+    "1440p": (2560, 1440),
+    "4k": (3840, 2160),
+}
+
+
+class Widget(NamedTuple):
+    rect: Rect
+    label: str
+
+    @property
+    def center(self) -> Tuple[int, int]:
+        return (
+            int(self.rect.left + self.rect.width / 2),
+            int(self.rect.top + self.rect.height / 2),
+        )
+
+
+class Desktop(NamedTuple):
+    screen: np.ndarray
+    widgets: List[Widget]
+
+
+def _label(rnd: random.Random) -> str:
+    return "".join(rnd.choice(string.ascii_letters) for _ in range(rnd.randint(4, 9)))
+
+
+def _draw_window(screen: np.ndarray, rect: Rect, rnd: random.Random):
+    color = tuple(rnd.randint(200, 250) for _ in range(3))
+    cv2.rectangle(screen, rect[:2], (rect.right - 1, rect.bottom - 1), color, -1)
+    cv2.rectangle(screen, rect[:2], (rect.right - 1, rect.top + 28), (120, 80, 40), -1)
+    cv2.putText(
+        screen,
+        _label(rnd),
+        (rect.left + 8, rect.top + 20),
+        cv2.FONT_HERSHEY_SIMPLEX,
+        0.5,
+        (255, 255, 255),
+        1,
+        cv2.LINE_AA,
+    )
+    cv2.rectangle(screen, rect[:2], (rect.right - 1, rect.bottom - 1), (90, 90, 90), 1)
+
+
+def make_desktop(
+    width: int, height: int, *, seed: int = 0, windows: int = 6, widgets: int = 30
+) -> Desktop:
+    """
+    Desktop with random windows and buttons having unique labels
+    """
+    rnd = random.Random(seed)
+    gradient = np.linspace(60, 140, width, dtype=np.uint8)
+    screen = np.empty((height, width, 3), dtype=np.uint8)
+    screen[:] = gradient[None, :, None]
+    for _ in range(windows):
+        w, h = rnd.randint(width // 5, width // 2), rnd.randint(
+            height // 5, height // 2
+        )
+        left, top = rnd.randint(0, width - w), rnd.randint(0, height - h)
+        _draw_window(screen, Rect(left, top, left + w, top + h), rnd)
+
+    placed: List[Widget] = []
+    labels = set()
+    while len(placed) < widgets:
+        label = _label(rnd)
+        if label in labels:
+            continue
+        w, h = rnd.randint(70, 160), rnd.randint(24, 40)
+        left, top = rnd.randint(0, width - w), rnd.randint(0, height - h)
+        rect = Rect(left, top, left + w, top + h)
+        if any(
+            rect.left < p.rect.right + 4
+            and p.rect.left < rect.right + 4
+            and rect.top < p.rect.bottom + 4
+            and p.rect.top < rect.bottom + 4
+            for p in placed
+        ):
+            continue
+        color = tuple(rnd.randint(0, 255) for _ in range(3))
+        cv2.rectangle(screen, (left, top), (rect.right - 1, rect.bottom - 1), color, -1)
+        cv2.rectangle(
+            screen, (left, top), (rect.right - 1, rect.bottom - 1), (30, 30, 30), 1
+        )
+        cv2.putText(
+            screen,
+            label,
+            (left + 6, top + h // 2 + 5),
+            cv2.FONT_HERSHEY_SIMPLEX,
+            0.45,
+            tuple(255 - c for c in color),
+            1,
+            cv2.LINE_AA,
+        )
+        labels.add(label)
+        placed.append(Widget(rect, label))
+    return Desktop(screen, placed)
+
+
+def add_noise(screen: np.ndarray, sigma: float, *, seed: int = 0) -> np.ndarray:
+    """
+    Gaussian pixel noise, e.g. to emulate compression artifacts of the remote desktops
+    """
+    if not sigma:
+        return screen
+    noise = np.random.default_rng(seed).normal(0, sigma, screen.shape)
+    return np.clip(screen.astype(np.float32) + noise, 0, 255).astype(np.uint8)
+
+
+def cut_template(desktop: Desktop, index: int, *, scale: float = 1.0) -> np.ndarray:
+    """
+    Widget image as a template, optionally rescaled to emulate the templates recorded with other DPI
+    """
+    rect = desktop.widgets[index].rect
+    template = desktop.screen[rect.top : rect.bottom, rect.left : rect.right].copy()
+    if scale != 1.0:
+        template = cv2.resize(
+            template,
+            (max(1, round(rect.width * scale)), max(1, round(rect.height * scale))),
+            interpolation=cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR,
+        )
+    return template
+
+
+def embed_copy(desktop: Desktop, index: int, *, seed: int = 0) -> Desktop:
+    """
+    Desktop with one more copy of the widget pasted where it overlaps no other widget
+    """
+    rnd = random.Random(seed)
+    src = desktop.widgets[index].rect
+    height, width = desktop.screen.shape[:2]
+    while True:
+        left = rnd.randint(0, width - src.width)
+        top = rnd.randint(0, height - src.height)
+        rect = Rect(left, top, left + src.width, top + src.height)
+        if not any(
+            rect.left < w.rect.right + 4
+            and w.rect.left < rect.right + 4
+            and rect.top < w.rect.bottom + 4
+            and w.rect.top < rect.bottom + 4
+            for w in desktop.widgets
+        ):
+            break
+    screen = desktop.screen.copy()
+    screen[rect.top : rect.bottom, rect.left : rect.right] = desktop.screen[
+        src.top : src.bottom, src.left : src.right
+    ]
+    return Desktop(
+        screen, [*desktop.widgets, Widget(rect, desktop.widgets[index].label)]
+    )
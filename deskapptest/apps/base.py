@@ -1,44 +1,45 @@
+from __future__ import annotations
+
 import abc
-import time
 import logging as log
-import pyautogui
-import os
-import tempfile
-from typing import List, Optional as Opt, Tuple, TypedDict
-
-from PIL import ImageGrab, Image
-from airtest.core.api import Template
-from airtest.core.settings import Settings
-from airtest.core.error import TargetNotFoundError
-from airtest.aircv.utils import pil_2_cv2
-from pywinauto.timings import Timings
-
-from deskapptest.utils import conf
-from deskapptest.utils.wait import _init_wait
-
-# Prevents the error on virtual machines
-pyautogui.FAILSAFE = False
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    List,
+    Optional as Opt,
+    Sequence,
+    Tuple,
+    TypedDict,
+    Union,
+)
+
+from deskapptest.utils import dirty, frames, matching, metrics, textentry, timing
+from deskapptest.utils.backends import configure, pyautogui, settings as _settings
+from deskapptest.utils.lazy import LazyModule
+from deskapptest.utils.wait import (
+    WaitPolicy,
+    _init_policy,
+    _init_wait,
+    async_wait_until,
+    wait_until,
+)
+
+if TYPE_CHECKING:
+    from concurrent.futures import Executor
+
+    from airtest.core.api import Template
+
 # Enable debug logs from airtest to keep track of template matching
 log.getLogger("airtest").setLevel(log.DEBUG)
 # Disable log noises
 log.getLogger("PIL").setLevel(log.ERROR)
-# pywinauto settings
-Timings.after_sendkeys_key_wait = conf.read_toml(
-    "pywinauto-configuration", "after_sendkeys_key_wait"
-)
-Timings.after_clickinput_wait = conf.read_toml(
-    "pywinauto-configuration", "after_clickinput_wait"
-)
-Timings.window_find_timeout = conf.read_toml(
-    "pywinauto-configuration", "window_find_timeout"
-)
-Timings.window_find_retry = conf.read_toml(
-    "pywinauto-configuration", "window_find_retry"
-)
-# airtest settings
-Settings.FIND_TIMEOUT = conf.read_toml("airtest-configuration", "find_timeout")
-Settings.THRESHOLD = conf.read_toml("airtest-configuration", "threshold")
-Settings.CVSTRATEGY = conf.read_toml("airtest-configuration", "cvstrategy")
+
+_error = LazyModule("airtest.core.error")
+_futures = LazyModule("concurrent.futures")
+_handleprops = LazyModule("pywinauto.handleprops")
+
 
 MatchResT = TypedDict(
     "MatchResT",
@@ -64,7 +65,65 @@ class App(abc.ABC):
         pass
 
 
+def close_apps(*apps: App) -> List[Any]:
+    """
+    Close the apps in parallel, takes as long as the slowest app close
+
+    :return: Results of :meth:`App.close` in the apps order
+    """
+    if not apps:
+        return []
+    with _futures.ThreadPoolExecutor(max_workers=len(apps)) as pool:
+        return list(pool.map(lambda app: app.close(), apps))
+
+
+RegionT = Union[frames.Rect, Tuple[int, int, int, int], int, Any]
+
+
+def _resolve_region(region: Opt[RegionT]) -> Opt[frames.Rect]:
+    """
+    Screen rectangle from a (left, top, right, bottom) tuple, a window handle, a RECT-like object
+    or an object with rectangle() method (e.g. windows.Window or pywinauto wrapper)
+    """
+    if region is None:
+        return None
+    if isinstance(region, int):
+        region = _handleprops.rectangle(region)
+    elif hasattr(region, "rectangle"):
+        region = region.rectangle()
+        if region is None:
+            return None
+    if hasattr(region, "left"):
+        region = (region.left, region.top, region.right, region.bottom)
+    left, top, right, bottom = (int(v) for v in region)
+    # Frame sources do not grab beyond the top-left screen corner
+    return frames.Rect(max(0, left), max(0, top), right, bottom)
+
+
+def _search_resolution(
+    template: Template,
+    region: Opt[frames.Rect],
+    source: Opt[frames.FrameSource] = None,
+) -> Opt[Tuple[int, int]]:
+    """
+    Full desktop resolution to scale the template recorded with resolution when only a region is searched
+    """
+    if region is None or not template.resolution:
+        return None
+    return (source or frames.get_source()).size()
+
+
 class Window:
+    """
+    Window which templates are searched within its rectangle
+    """
+
+    def rectangle(self) -> Opt[RegionT]:
+        """
+        Screen area to search the window templates in. The whole desktop by default
+        """
+        return None
+
     def click_template(
         self,
         template: Template,
@@ -72,24 +131,51 @@ class Window:
         right_click: bool = False,
         wait_ms: Opt[int] = None,
         retry_ms: Opt[int] = None,
+        region: Opt[RegionT] = None,
     ):
         click_template(
-            template, right_click=right_click, wait_ms=wait_ms, retry_ms=retry_ms
+            template,
+            right_click=right_click,
+            wait_ms=wait_ms,
+            retry_ms=retry_ms,
+            region=region or self.rectangle(),
         )
 
-    def dclick_template(self, template: Template):
-        dclick_template(template)
+    def dclick_template(self, template: Template, *, region: Opt[RegionT] = None):
+        dclick_template(template, region=region or self.rectangle())
 
-    def set_text_template(self, template: Template, text: str):
-        set_text(template, text)
+    def set_text_template(
+        self,
+        template: Template,
+        text: str,
+        *,
+        region: Opt[RegionT] = None,
+        strategy: Opt[str] = None,
+    ):
+        set_text(template, text, region=region or self.rectangle(), strategy=strategy)
         return self
 
 
-def screenshot_desktop():
-    fh, filepath = tempfile.mkstemp(".png")
-    os.close(fh)
-    ImageGrab.grab().save(filepath)
-    return filepath
+@metrics.timed("base.screenshot_desktop")
+def screenshot_desktop(path: Opt[str] = None) -> str:
+    """
+    Save the desktop frame into PNG file (temporary one if path is not set). Return the file path
+
+    Template search does not use files, see :mod:`deskapptest.utils.frames`
+    """
+    return frames.save_frame(frames.grab(), path)
+
+
+def _set_threshold(template: Template, threshold: Opt[float]):
+    if threshold:
+        template.threshold = threshold
+    else:
+        # Overwrite default value
+        template.threshold = (
+            template.threshold
+            if template.threshold != 0.7
+            else _settings.Settings.THRESHOLD
+        )
 
 
 def find_all_templates(
@@ -98,32 +184,95 @@ def find_all_templates(
     wait_ms: Opt[int] = None,
     retry_ms: Opt[int] = None,
     threshold: Opt[float] = None,
+    region: Opt[RegionT] = None,
+    policy: Opt[WaitPolicy] = None,
+    source: Opt[frames.FrameSource] = None,
 ) -> List[MatchResT]:
+    """
+    :param region: Search only within the screen rectangle, see :func:`_resolve_region`. Returned coordinates
+        are in the screen space
+    :param policy: Intervals between the retries, see :class:`~deskapptest.utils.wait.WaitPolicy`
+    :param source: Frames to search in, the default source if not set. Recorded sources are replayed
+        without sleeping, see :class:`~deskapptest.utils.frames.ReplaySource`
+    """
+    source = source or frames.get_source()
     wait, retry = _init_wait(
-        wait_ms, retry_ms, wait_ms_def=Settings.FIND_TIMEOUT * 1000
+        wait_ms, retry_ms, wait_ms_def=_settings.Settings.FIND_TIMEOUT * 1000
     )
+    rect = _resolve_region(region)
     log.info(
-        f"Start finding templates={template} with wait_ms={wait}, retry_ms={retry}"
+        f"Start finding templates={template} with wait_ms={wait}, retry_ms={retry}, region={rect}"
     )
 
-    template.threshold = Settings.THRESHOLD
-    threshold = threshold or Settings.THRESHOLD
+    template.threshold = _settings.Settings.THRESHOLD
+    threshold = threshold or _settings.Settings.THRESHOLD
+    resolution = _search_resolution(template, rect, source)
+
+    # Match only the screen areas changed since the previous retry
+    tracker = dirty.DirtyTiles()
 
-    waited = 0
-    while True:
-        img = Image.open(screenshot_desktop())
-        screen = pil_2_cv2(img)
-        match_poses = template.match_all_in(screen) or []
+    def find():
+        screen = frames.grab(rect, source=source)
+        tracker.update(screen)
+        match_poses = matching.match_all_in(
+            template, screen, resolution=resolution, tracker=tracker
+        )
         log.debug(f"All matches={match_poses}")
         match_poses = [mp for mp in match_poses if mp["confidence"] >= threshold]
         log.debug(f"Threshold matches={match_poses}")
+        return match_poses
+
+    match_poses = wait_until(
+        find,
+        wait_ms=wait,
+        policy=_init_policy(retry, policy),
+        sleep=source.sleep,
+        clock=source.clock,
+    ).value
+    if rect:
+        match_poses = [
+            matching.offset_match(mp, rect.left, rect.top) for mp in match_poses
+        ]
+    return match_poses
 
-        if match_poses or waited >= wait:
-            break
-        time.sleep(retry / 1000)
-        waited += retry
 
-    return match_poses
+def _template_finder(
+    template: Template,
+    *,
+    wait_ms: Opt[int],
+    retry_ms: Opt[int],
+    threshold: Opt[float],
+    region: Opt[RegionT],
+    source: Opt[frames.FrameSource] = None,
+) -> Tuple[Callable[[], Opt[Tuple[int, int]]], int, int]:
+    """
+    Single template search attempt returning the screen position or None, and the (wait, retry) of the search
+    """
+    wait, retry = _init_wait(
+        wait_ms, retry_ms, wait_ms_def=_settings.Settings.FIND_TIMEOUT * 1000
+    )
+    rect = _resolve_region(region)
+    log.info(
+        f"Start finding template={template} with wait_ms={wait}, retry_ms={retry}, region={rect}"
+    )
+
+    _set_threshold(template, threshold)
+    resolution = _search_resolution(template, rect, source)
+
+    # Match only the screen areas changed since the previous retry
+    tracker = dirty.DirtyTiles()
+
+    def find():
+        screen = frames.grab(rect, source=source)
+        tracker.update(screen)
+        match_pos = matching.match_in(
+            template, screen, resolution=resolution, tracker=tracker
+        )
+        if match_pos and rect:
+            return matching.offset_pos(match_pos, rect.left, rect.top)
+        return match_pos
+
+    return find, wait, retry
 
 
 def find_template(
@@ -132,41 +281,226 @@ def find_template(
     wait_ms: Opt[int] = None,
     retry_ms: Opt[int] = None,
     threshold: Opt[float] = None,
+    region: Opt[RegionT] = None,
+    policy: Opt[WaitPolicy] = None,
+    source: Opt[frames.FrameSource] = None,
 ) -> Tuple[int, int]:
-    wait, retry = _init_wait(
-        wait_ms, retry_ms, wait_ms_def=Settings.FIND_TIMEOUT * 1000
+    """
+    :param region: Search only within the screen rectangle, see :func:`_resolve_region`. Returned coordinates
+        are in the screen space
+    :param policy: Intervals between the retries, see :class:`~deskapptest.utils.wait.WaitPolicy`
+    :param source: See :func:`find_all_templates`
+    """
+    source = source or frames.get_source()
+    find, wait, retry = _template_finder(
+        template,
+        wait_ms=wait_ms,
+        retry_ms=retry_ms,
+        threshold=threshold,
+        region=region,
+        source=source,
     )
-    log.info(f"Start finding template={template} with wait_ms={wait}, retry_ms={retry}")
+    match_pos = wait_until(
+        find,
+        wait_ms=wait,
+        policy=_init_policy(retry, policy),
+        sleep=source.sleep,
+        clock=source.clock,
+    ).value
+    if match_pos:
+        return match_pos
+    else:
+        raise _error.TargetNotFoundError("Picture %s not found in screen" % template)
 
-    if threshold:
-        template.threshold = threshold
+
+async def async_find_template(
+    template: Template,
+    *,
+    wait_ms: Opt[int] = None,
+    retry_ms: Opt[int] = None,
+    threshold: Opt[float] = None,
+    region: Opt[RegionT] = None,
+    policy: Opt[WaitPolicy] = None,
+    executor: Opt[Executor] = None,
+) -> Tuple[int, int]:
+    """
+    :func:`find_template` for asyncio, the screen grabbing and matching run in the executor
+
+    Usage:
+    await wait.first_of(async_find_template(ok_btn), async_find_template(error_dialog))
+    """
+    find, wait, retry = _template_finder(
+        template, wait_ms=wait_ms, retry_ms=retry_ms, threshold=threshold, region=region
+    )
+    result = await async_wait_until(
+        find,
+        wait_ms=wait,
+        policy=_init_policy(retry, policy),
+        offload=True,
+        executor=executor,
+    )
+    if result:
+        return result.value
     else:
-        # Overwrite default value
-        template.threshold = (
-            template.threshold if template.threshold != 0.7 else Settings.THRESHOLD
-        )
+        raise _error.TargetNotFoundError("Picture %s not found in screen" % template)
 
-    waited = 0
-    while True:
-        img = Image.open(screenshot_desktop())
-        screen = pil_2_cv2(img)
-        match_pos = template.match_in(screen)
 
-        if match_pos or waited >= wait:
-            break
-        time.sleep(retry / 1000)
-        waited += retry
+def find_many(
+    templates: Sequence[Template],
+    *,
+    wait_ms: Opt[int] = None,
+    retry_ms: Opt[int] = None,
+    threshold: Opt[float] = None,
+    region: Opt[RegionT] = None,
+    first_only: bool = False,
+    policy: Opt[WaitPolicy] = None,
+    source: Opt[frames.FrameSource] = None,
+) -> Dict[Template, Opt[Tuple[int, int]]]:
+    """
+    Search several templates sharing one wait: every retry grabs one frame and matches all the templates
+    not found yet against it. Wait until all the templates are found (or any of them if first_only)
+
+    :param source: See :func:`find_all_templates`
+    :return: Template -> position mapping, None for not found templates
+    """
+    source = source or frames.get_source()
+    wait, retry = _init_wait(
+        wait_ms, retry_ms, wait_ms_def=_settings.Settings.FIND_TIMEOUT * 1000
+    )
+    rect = _resolve_region(region)
+    log.info(
+        f"Start finding templates={templates} with wait_ms={wait}, retry_ms={retry}, region={rect}"
+    )
 
-    if match_pos:
-        return match_pos
-    else:
-        raise TargetNotFoundError("Picture %s not found in screen" % template)
+    for template in templates:
+        _set_threshold(template, threshold)
+    resolutions = {t: _search_resolution(t, rect, source) for t in templates}
+    found: Dict[Template, Opt[Tuple[int, int]]] = dict.fromkeys(templates)
+
+    # Match only the screen areas changed since the previous retry
+    tracker = dirty.DirtyTiles()
+
+    def find():
+        screen = frames.grab(rect, source=source)
+        tracker.update(screen)
+        for template in templates:
+            if found[template]:
+                continue
+            match_pos = matching.match_in(
+                template, screen, resolution=resolutions[template], tracker=tracker
+            )
+            if match_pos:
+                found[template] = (
+                    matching.offset_pos(match_pos, rect.left, rect.top)
+                    if rect
+                    else match_pos
+                )
+                if first_only:
+                    break
+
+        return any(found.values()) if first_only else all(found.values())
+
+    wait_until(
+        find,
+        wait_ms=wait,
+        policy=_init_policy(retry, policy),
+        sleep=source.sleep,
+        clock=source.clock,
+    )
+    return found
 
 
-def hover_crd(x: int, y: int, *, wait_after: float = 0.5):
+def find_any(
+    templates: Sequence[Template],
+    *,
+    wait_ms: Opt[int] = None,
+    retry_ms: Opt[int] = None,
+    threshold: Opt[float] = None,
+    region: Opt[RegionT] = None,
+    policy: Opt[WaitPolicy] = None,
+    source: Opt[frames.FrameSource] = None,
+) -> Tuple[Template, Tuple[int, int]]:
+    """
+    First found template of several ones, checked in the given order on every frame
+
+    :param source: See :func:`find_all_templates`
+    :return: The found template and its position
+    """
+    found = find_many(
+        templates,
+        wait_ms=wait_ms,
+        retry_ms=retry_ms,
+        threshold=threshold,
+        region=region,
+        first_only=True,
+        policy=policy,
+        source=source,
+    )
+    for template, pos in found.items():
+        if pos:
+            return template, pos
+    raise _error.TargetNotFoundError("Pictures %s not found in screen" % templates)
+
+
+def hover_crd(
+    x: int,
+    y: int,
+    *,
+    wait_after: Opt[float] = None,
+    ready: Opt[Callable[[], bool]] = None,
+):
+    """
+    :param wait_after: Seconds, the timing profile hover_wait by default
+    :param ready: UI readiness check ending the wait earlier, the whole wait is slept without it
+    """
     log.debug(f"Hover x={x}, y={y}")
-    pyautogui.moveTo(x, y, duration=0.25)
-    time.sleep(wait_after)
+    profile = timing.current()
+    pyautogui.moveTo(x, y, duration=profile.move_duration)
+    timing.pause(profile.hover_wait if wait_after is None else wait_after, ready)
+
+
+# Half size of the box around the click point watched for the UI reaction
+_REACTION_PX = 16
+
+
+def _click_at(pos: Tuple[int, int], click: Callable[[], Any]):
+    """
+    Hover, click and move the cursor away.
+
+    With the "check" readiness the hover ends once the pixels around the point stop changing (e.g. the hover
+    highlight is drawn) and the click once they are changed by the click. They are compared while the cursor
+    is still hovering the point, so the hover highlight does not count as the reaction, and the cursor is moved
+    away after that
+    """
+    x, y = pos
+    if timing.current().readiness != timing.CHECK:
+        hover_crd(x, y)
+        click()
+        hover_crd(1, 1)
+        return
+    box = frames.Rect(
+        max(0, x - _REACTION_PX),
+        max(0, y - _REACTION_PX),
+        x + _REACTION_PX,
+        y + _REACTION_PX,
+    )
+    hovered = []
+
+    def settled() -> bool:
+        frame = frames.grab(box)
+        if hovered and (frame == hovered[-1]).all():
+            return True
+        hovered[:] = [frame.copy()]
+        return False
+
+    hover_crd(x, y, ready=settled)
+    if not hovered:  # No hover wait
+        settled()
+    click()
+    timing.pause(
+        timing.current().hover_wait, lambda: (frames.grab(box) != hovered[-1]).any()
+    )
+    hover_crd(1, 1, wait_after=0)
 
 
 def click_template(
@@ -176,20 +510,24 @@ def click_template(
     wait_ms: Opt[int] = None,
     retry_ms: Opt[int] = None,
     threshold: Opt[float] = None,
+    region: Opt[RegionT] = None,
 ):
     pos = find_template(
-        template, wait_ms=wait_ms, retry_ms=retry_ms, threshold=threshold
+        template, wait_ms=wait_ms, retry_ms=retry_ms, threshold=threshold, region=region
+    )
+    _click_at(
+        pos,
+        lambda: pyautogui.click(
+            button=pyautogui.RIGHT if right_click else pyautogui.LEFT
+        ),
     )
-    hover_crd(*pos)
-    pyautogui.click(button=pyautogui.RIGHT if right_click else pyautogui.LEFT)
-    hover_crd(1, 1)
 
 
-def dclick_template(template: Template, *, wait_ms=None, retry_ms=None):
-    pos = find_template(template, wait_ms=wait_ms, retry_ms=retry_ms)
-    hover_crd(*pos)
-    pyautogui.click(clicks=2, interval=0.05)
-    hover_crd(1, 1)
+def dclick_template(
+    template: Template, *, wait_ms=None, retry_ms=None, region: Opt[RegionT] = None
+):
+    pos = find_template(template, wait_ms=wait_ms, retry_ms=retry_ms, region=region)
+    _click_at(pos, lambda: pyautogui.click(clicks=2, interval=0.05))
 
 
 def is_template_visible(
@@ -198,15 +536,56 @@ def is_template_visible(
     wait_ms: Opt[int] = None,
     retry_ms: Opt[int] = None,
     threshold: Opt[float] = None,
+    region: Opt[RegionT] = None,
 ):
     try:
         return find_template(
-            template, threshold=threshold, wait_ms=wait_ms, retry_ms=retry_ms
+            template,
+            threshold=threshold,
+            wait_ms=wait_ms,
+            retry_ms=retry_ms,
+            region=region,
+        )
+    except _error.TargetNotFoundError:
+        return False
+
+
+async def async_is_template_visible(
+    template: Template,
+    *,
+    wait_ms: Opt[int] = None,
+    retry_ms: Opt[int] = None,
+    threshold: Opt[float] = None,
+    region: Opt[RegionT] = None,
+):
+    try:
+        return await async_find_template(
+            template,
+            threshold=threshold,
+            wait_ms=wait_ms,
+            retry_ms=retry_ms,
+            region=region,
         )
-    except TargetNotFoundError:
+    except _error.TargetNotFoundError:
         return False
 
 
-def set_text(template: Template, text: str):
-    click_template(template)
-    pyautogui.typewrite(text)
+def set_text(
+    template: Template,
+    text: str,
+    *,
+    region: Opt[RegionT] = None,
+    strategy: Opt[str] = None,
+):
+    """
+    Click the template and type or paste the text, see :func:`textentry.choose`
+
+    :param strategy: "auto", "type" or "paste", [project-configuration.text-entry] strategy by default
+    """
+    click_template(template, region=region)
+    textentry.enter_text(
+        text,
+        type_text=pyautogui.typewrite,
+        send_paste=lambda: pyautogui.hotkey("ctrl", "v"),
+        strategy=strategy,
+    )
@@ -0,0 +1,395 @@
+"""
+Snapshot of a UI element subtree with the indexed element properties
+
+Reading an element property is a cross-process call for UIA, so the subtree is walked once and the properties
+are copied into records. Elements only need `children()` and `element_info`, fake trees work as well.
+"""
+
+import functools
+import re
+import threading
+import time
+from collections import defaultdict
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional as Opt,
+    Tuple,
+)
+
+from deskapptest.utils.conf import read_toml
+
+
+class ElementRecord(NamedTuple):
+    name: Opt[str]
+    class_name: Opt[str]
+    control_type: Opt[str]
+    automation_id: Opt[str]
+    handle: Opt[int]
+    # 1 for the children of the root
+    depth: int
+    wrapper: Any
+
+    @property
+    def title(self) -> Opt[str]:
+        return self.name
+
+
+# Record properties read from element_info
+PROPS = ("name", "class_name", "control_type", "automation_id", "handle")
+# Properties with O(1) lookups
+INDEXED = ("name", "class_name", "control_type", "automation_id")
+
+
+def _record(wrapper, depth: int) -> ElementRecord:
+    info = wrapper.element_info
+    return ElementRecord(
+        *(getattr(info, prop, None) for prop in PROPS), depth=depth, wrapper=wrapper
+    )
+
+
+class ElementSnapshot:
+    """
+    Records of the root descendants up to the depth with the indexes by :data:`INDEXED` properties
+    """
+
+    def __init__(self, root, *, depth: int = 1):
+        self.depth = depth
+        self.records: List[ElementRecord] = []
+        self.taken = time.monotonic()
+        self._indexes: Dict[str, Dict[Any, List[ElementRecord]]] = {
+            prop: defaultdict(list) for prop in INDEXED
+        }
+        self._walk(root, 1)
+        for record in self.records:
+            for prop in INDEXED:
+                self._indexes[prop][getattr(record, prop)].append(record)
+
+    def _walk(self, wrapper, depth: int):
+        for child in wrapper.children():
+            self.records.append(_record(child, depth))
+            if depth < self.depth:
+                self._walk(child, depth + 1)
+
+    def find(
+        self,
+        predicate: Opt[Callable[[ElementRecord], bool]] = None,
+        **props,
+    ) -> List[ElementRecord]:
+        """
+        Records equal to all the props (title is an alias of name) and matching the predicate, in the walk order
+
+        Usage:
+        snapshot.find(automation_id="OkButton")
+        snapshot.find(lambda r: r.name.startswith("Save"), control_type="Button")
+        """
+        if "title" in props:
+            props["name"] = props.pop("title")
+        indexed = [prop for prop in props if prop in self._indexes]
+        if indexed:
+            candidates = min(
+                (self._indexes[prop].get(props[prop], []) for prop in indexed), key=len
+            )
+        else:
+            candidates = self.records
+        return [
+            r
+            for r in candidates
+            if all(getattr(r, prop) == v for prop, v in props.items())
+            and (predicate is None or predicate(r))
+        ]
+
+    def first(
+        self, predicate: Opt[Callable[[ElementRecord], bool]] = None, **props
+    ) -> Opt[ElementRecord]:
+        found = self.find(predicate, **props)
+        return found[0] if found else None
+
+
+class ElementTree:
+    """
+    Element snapshot of the root retaken when it is older than the TTL or invalidated
+
+    Usage:
+    tree = ElementTree(window_spec)
+    tree.snapshot().first(automation_id="OkButton")
+    tree.invalidate()  # After an action changing the UI
+    """
+
+    def __init__(self, root, *, depth: Opt[int] = None, ttl_ms: Opt[int] = None):
+        """
+        :param depth: [project-configuration.element-snapshot] depth by default
+        :param ttl_ms: [project-configuration.element-snapshot] ttl_ms by default
+        """
+        self.root = root
+        self.depth = depth or read_toml(
+            "project-configuration.element-snapshot", "depth"
+        )
+        self.ttl_ms = (
+            ttl_ms
+            if ttl_ms is not None
+            else read_toml("project-configuration.element-snapshot", "ttl_ms")
+        )
+        self._snapshot: Opt[ElementSnapshot] = None
+
+    def snapshot(self) -> ElementSnapshot:
+        snapshot = self._snapshot
+        if (
+            snapshot is None
+            or (time.monotonic() - snapshot.taken) * 1000 >= self.ttl_ms
+        ):
+            snapshot = self._snapshot = ElementSnapshot(self.root, depth=self.depth)
+        return snapshot
+
+    def invalidate(self):
+        self._snapshot = None
+
+
+# Criteria fields supported by the top-level windows index, flags with their supported values
+_WINDOW_FLAGS = {
+    "top_level_only": (True,),
+    "visible_only": (True, False),
+    "enabled_only": (True, False),
+    "active_only": (False,),
+}
+_WINDOW_FIELDS = {"title", "title_re", "class_name", "class_name_re", "process"}
+
+# Criteria fields compared with the element record properties
+_RECORD_FIELDS = {
+    "title": "name",
+    "class_name": "class_name",
+    "control_type": "control_type",
+    "auto_id": "automation_id",
+    "handle": "handle",
+}
+# Criteria fields evaluated in-process, the window flags do not apply to the snapshot children.
+# Other fields (control_id, process, found_index, predicate_func, fuzzy best_match...) need a pywinauto lookup
+_MATCHED_FIELDS = {*_RECORD_FIELDS, "title_re", "class_name_re", *_WINDOW_FLAGS}
+
+
+class CriteriaMatcher(NamedTuple):
+    """
+    Immutable populated (not None) fields of the window criteria, usable as a cache key if the values are hashable.
+    Regexes are compiled once per distinct criteria
+
+    Usage:
+    matcher = CriteriaMatcher.compile((("title_re", "Save.*"), ("control_type", "Button")))
+    find_elements(**matcher.kwargs)
+    matcher.first(snapshot)
+    """
+
+    items: Tuple[Tuple[str, Any], ...]
+    # Record properties to be equal to
+    props: Tuple[Tuple[str, Any], ...]
+    title_re: Opt[re.Pattern]
+    class_name_re: Opt[re.Pattern]
+
+    @staticmethod
+    def compile(items: Tuple[Tuple[str, Any], ...]) -> "CriteriaMatcher":
+        """
+        :param items: (field, value) pairs of the populated criteria fields. Criteria with unhashable values
+            (e.g. a list of control types or a closure) are compiled every time
+        """
+        try:
+            return _compile_cached(items)
+        except TypeError:  # Unhashable items
+            return CriteriaMatcher._compile(items)
+
+    @staticmethod
+    def _compile(items: Tuple[Tuple[str, Any], ...]) -> "CriteriaMatcher":
+        fields = dict(items)
+        props = tuple(
+            (prop, fields[field])
+            for field, prop in _RECORD_FIELDS.items()
+            if field in fields
+        )
+        return CriteriaMatcher(
+            items,
+            props,
+            re.compile(fields["title_re"]) if "title_re" in fields else None,
+            re.compile(fields["class_name_re"]) if "class_name_re" in fields else None,
+        )
+
+    @property
+    def kwargs(self) -> Dict[str, Any]:
+        """
+        pywinauto window specification kwargs
+        """
+        return dict(self.items)
+
+    def _matches_rest(self, record: ElementRecord) -> bool:
+        if self.title_re and not (
+            record.name is not None and self.title_re.match(record.name)
+        ):
+            return False
+        if self.class_name_re and not (
+            record.class_name is not None
+            and self.class_name_re.match(record.class_name)
+        ):
+            return False
+        return True
+
+    @property
+    def in_process(self) -> bool:
+        """
+        All the criteria fields can be checked against the element records, see :meth:`matches`
+        """
+        return all(field in _MATCHED_FIELDS for field, _ in self.items)
+
+    def matches(self, record: ElementRecord) -> bool:
+        """
+        Check the element record in-process: the record properties, title_re and class_name_re.
+        The window flags (visible_only etc.) are not applied, other fields require :attr:`in_process` False
+        and a pywinauto lookup
+        """
+        return all(
+            getattr(record, prop) == v for prop, v in self.props
+        ) and self._matches_rest(record)
+
+    @property
+    def window_indexable(self) -> bool:
+        """
+        The criteria can be evaluated with :class:`TopWindowIndex`
+        """
+        return all(
+            (
+                value in _WINDOW_FLAGS[field]
+                if field in _WINDOW_FLAGS
+                else field in _WINDOW_FIELDS
+            )
+            for field, value in self.items
+        )
+
+    def matches_window(self, record: "WindowRecord") -> bool:
+        """
+        Check the top-level window record the same way as pywinauto find_elements does
+        """
+        fields = dict(self.items)
+        return (
+            ("title" not in fields or record.title == fields["title"])
+            and (
+                self.title_re is None
+                or (record.title is not None and self.title_re.match(record.title))
+            )
+            and (
+                "class_name" not in fields or record.class_name == fields["class_name"]
+            )
+            and (
+                self.class_name_re is None
+                or (
+                    record.class_name is not None
+                    and self.class_name_re.match(record.class_name)
+                )
+            )
+            and ("process" not in fields or record.process_id == fields["process"])
+            and (not fields.get("visible_only") or record.visible)
+            and (not fields.get("enabled_only") or record.enabled)
+        )
+
+    def find(self, snapshot: ElementSnapshot) -> List[ElementRecord]:
+        unsupported = [f for f, _ in self.items if f not in _MATCHED_FIELDS]
+        assert not unsupported, f"Fields={unsupported} are not matched in-process"
+        return snapshot.find(self._matches_rest, **dict(self.props))
+
+    def first(self, snapshot: ElementSnapshot) -> Opt[ElementRecord]:
+        found = self.find(snapshot)
+        return found[0] if found else None
+
+
+_compile_cached = functools.lru_cache(maxsize=256)(CriteriaMatcher._compile)
+
+
+class WindowRecord(NamedTuple):
+    handle: int
+    process_id: int
+    class_name: Opt[str]
+    title: Opt[str]
+    visible: bool
+    enabled: bool
+    element_info: Any
+
+
+def window_record(info) -> WindowRecord:
+    return WindowRecord(
+        info.handle,
+        info.process_id,
+        info.class_name,
+        info.rich_text,
+        info.visible,
+        info.enabled,
+        info,
+    )
+
+
+class TopWindowIndex:
+    """
+    Shared snapshot of the top-level windows retaken after the TTL. Concurrent lookups wait for
+    the enumeration already in progress instead of starting their own
+
+    Usage:
+    index = TopWindowIndex(lambda: find_elements(top_level_only=True, visible_only=False))
+    index.find(criteria.matcher)
+    """
+
+    def __init__(
+        self, enumerate_fn: Callable[[], Iterable[Any]], *, ttl_ms: Opt[int] = None
+    ):
+        """
+        :param enumerate_fn: All top-level element infos
+        :param ttl_ms: [project-configuration.window-index] ttl_ms by default
+        """
+        self._enumerate = enumerate_fn
+        self.ttl_ms = (
+            ttl_ms
+            if ttl_ms is not None
+            else read_toml("project-configuration.window-index", "ttl_ms")
+        )
+        self._records: Opt[List[WindowRecord]] = None
+        self._by_process: Dict[int, List[WindowRecord]] = {}
+        self._taken = 0.0
+        self._lock = threading.Lock()
+        self.enumerations = 0
+
+    def _stale(self) -> bool:
+        return (
+            self._records is None
+            or (time.monotonic() - self._taken) * 1000 >= self.ttl_ms
+        )
+
+    def records(self) -> List[WindowRecord]:
+        return self._snapshot()[0]
+
+    def _snapshot(self) -> Tuple[List[WindowRecord], Dict[int, List[WindowRecord]]]:
+        with self._lock:
+            if self._stale():
+                records = []
+                for info in self._enumerate():
+                    try:
+                        records.append(window_record(info))
+                    except Exception:  # The window is closed while reading it
+                        continue
+                by_process = defaultdict(list)
+                for record in records:
+                    by_process[record.process_id].append(record)
+                self._records, self._by_process = records, dict(by_process)
+                self._taken = time.monotonic()
+                self.enumerations += 1
+            return self._records, self._by_process
+
+    def find(self, matcher: CriteriaMatcher) -> List[WindowRecord]:
+        """
+        Windows matching the criteria in the enumeration order, see :attr:`CriteriaMatcher.window_indexable`
+        """
+        records, by_process = self._snapshot()
+        process = dict(matcher.items).get("process")
+        if process is not None:
+            records = by_process.get(process, [])
+        return [r for r in records if matcher.matches_window(r)]
+
+    def invalidate(self):
+        with self._lock:
+            self._records = None
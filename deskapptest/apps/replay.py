@@ -0,0 +1,103 @@
+"""
+Template searches in the recorded sessions (image directories or videos) instead of the live desktop
+
+Recordings are replayed at CPU speed, see :class:`~deskapptest.utils.frames.ReplaySource`, and the jobs are
+spread over a process pool, so template sets and thresholds are evaluated without a desktop.
+
+Usage:
+jobs = [ReplayJob("ok.png", "session.mp4", threshold=t) for t in (0.7, 0.8, 0.9)]
+for r in evaluate(jobs):
+    print(r.job.threshold, r.found, r.found_ms)
+"""
+
+import os
+import time
+from typing import Any, Iterable, List, NamedTuple, Optional as Opt, Tuple, Union
+
+from deskapptest.apps.base import find_all_templates, find_template
+from deskapptest.utils import frames
+from deskapptest.utils.backends import settings as _settings
+from deskapptest.utils.lazy import LazyModule
+
+_cv = LazyModule("airtest.core.cv")
+_error = LazyModule("airtest.core.error")
+_futures = LazyModule("concurrent.futures")
+
+
+class ReplayJob(NamedTuple):
+    # Template image file
+    template: str
+    # Directory of the frame images or a video file
+    recording: str
+    threshold: Opt[float] = None
+    # Resolution the template is recorded with
+    resolution: Opt[Tuple[int, int]] = None
+    # Settings.CVSTRATEGY by default
+    cvstrategy: Opt[Tuple[str, ...]] = None
+    wait_ms: Opt[int] = None
+    retry_ms: Opt[int] = None
+    # Search all the matches with find_all_templates
+    find_all: bool = False
+
+
+class ReplayResult(NamedTuple):
+    job: ReplayJob
+    # Position, matches of find_all or None if not found
+    found: Any
+    # Recording time the search ended at
+    found_ms: float
+    cpu_ms: float
+
+
+def open_recording(
+    path: Union[str, os.PathLike], *, interval_ms: Opt[float] = None
+) -> frames.ReplaySource:
+    """
+    Replay of the image directory or the video file
+    """
+    if os.path.isdir(path):
+        return frames.DirectorySource(path, interval_ms=interval_ms)
+    return frames.VideoSource(path, interval_ms=interval_ms)
+
+
+def run_job(job: ReplayJob) -> ReplayResult:
+    template = _cv.Template(job.template, resolution=job.resolution or ())
+    Settings = _settings.Settings
+    prev_strategy = Settings.CVSTRATEGY
+    if job.cvstrategy:
+        Settings.CVSTRATEGY = list(job.cvstrategy)
+    started = time.process_time()
+    try:
+        with open_recording(job.recording) as source:
+            kwargs = dict(
+                wait_ms=job.wait_ms,
+                retry_ms=job.retry_ms,
+                threshold=job.threshold,
+                source=source,
+            )
+            if job.find_all:
+                found = find_all_templates(template, **kwargs) or None
+            else:
+                try:
+                    found = find_template(template, **kwargs)
+                except _error.TargetNotFoundError:
+                    found = None
+            found_ms = source.clock() * 1000
+    finally:
+        Settings.CVSTRATEGY = prev_strategy
+    return ReplayResult(job, found, found_ms, (time.process_time() - started) * 1000)
+
+
+def evaluate(
+    jobs: Iterable[ReplayJob], *, workers: Opt[int] = None
+) -> List[ReplayResult]:
+    """
+    Run the jobs in a process pool, the results are in the jobs order
+
+    :param workers: Number of the processes, the CPU count by default. 1 - run in the current process
+    """
+    jobs = list(jobs)
+    if workers == 1:
+        return [run_job(job) for job in jobs]
+    with _futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(run_job, jobs))
@@ -1,20 +1,26 @@
 import enum
-import time
+import functools
 import dataclasses
-import psutil
-from typing import Callable, Optional as Opt, Union
+import logging as log
+from typing import Callable, Optional as Opt, Tuple, Union
 
-from airtest.core.settings import Settings
+import win32gui
 from pywinauto import Application, MatchError, WindowSpecification, Desktop, timings
+from pywinauto import handleprops
 from pywinauto.controls.hwndwrapper import HwndWrapper
 from pywinauto.controls.uiawrapper import UIAWrapper
 from pywinauto.findwindows import find_elements
-from pywinauto.timings import Timings
+from pywinauto.uia_defines import get_elem_interface
+from pywinauto.uia_element_info import UIAElementInfo
 from pywinauto.win32_element_info import HwndElementInfo
 
-from .base import App as _App
-from deskapptest.utils import wait, proc
+from .base import App as _App, Window as _Window
+from .elements import CriteriaMatcher, ElementTree, TopWindowIndex
+from deskapptest.utils import metrics, wait, proc, textentry, timing
+from deskapptest.utils.backends import settings as _settings, timings as _timings
 
+# pywinauto is imported here anyway, so apply its configuration before the first call
+Timings = _timings.load().Timings
 WinWrapperT = Union[UIAWrapper, HwndWrapper]
 
 
@@ -41,9 +47,28 @@ class Criteria:
     framework_id: Opt[str] = None
     depth: Opt[str] = None
 
+    @property
+    def matcher(self) -> CriteriaMatcher:
+        """
+        Compiled populated fields, shared by the equal criteria
+        """
+        return CriteriaMatcher.compile(
+            tuple(
+                (name, getattr(self, name))
+                for name in _CRITERIA_FIELDS
+                if getattr(self, name) is not None
+            )
+        )
+
     @property
     def kwargs(self):
-        return dataclasses.asdict(self)
+        """
+        Populated fields only, unset ones are left to pywinauto defaults
+        """
+        return self.matcher.kwargs
+
+
+_CRITERIA_FIELDS = tuple(f.name for f in dataclasses.fields(Criteria))
 
 
 class WindowState(enum.Enum):
@@ -60,10 +85,26 @@ class WindowState(enum.Enum):
         return self.value
 
 
-class Window:
+@dataclasses.dataclass
+class WrapperStats:
+    """
+    Counters of the window wrapper lookups
+    """
+
+    # Full lookups by the criterias
+    resolved: int = 0
+    # Cached wrapper uses confirmed by the cheap validity check
+    revalidated: int = 0
+    # Focus calls for the foreground window already
+    focus_skipped: int = 0
+
+
+class Window(_Window):
     """
     The layer between WindowSpecficiation and window wrapper objects
 
+    Templates of the window (:meth:`click_template` etc.) are searched within the window rectangle
+
     Usage:
     - Start application
     Application().start('calc.exe')
@@ -81,10 +122,12 @@ class Window:
         self.window = window
         self._wait_ms = wait_ms
         self._retry_ms = retry_ms
-        self._criterias_kwgs = getattr(
-            window, "criteria", {}
-        )  # Save initial window criterias
+        # Save initial window criterias
+        self._criterias_kwgs = [dict(c) for c in getattr(window, "criteria", [])]
         self._wrapper: Opt[WinWrapperT] = None
+        self._handle: Opt[int] = None
+        self._elements: Opt[ElementTree] = None
+        self.stats = WrapperStats()
 
     @classmethod
     def with_criteria(cls, criteria: Criteria) -> "Window":
@@ -92,21 +135,63 @@ class Window:
 
     @property
     def handle(self):
+        """
+        Handle of the cached wrapper if it is still valid, the window is resolved without
+        waiting for its readiness otherwise, so disabled or busy windows have handles too
+        """
+        if self._handle and self._is_valid():
+            return self._handle
         return self.window_spec.handle
 
     @property
     def window_spec(self) -> WindowSpecification:
-        for i, v in enumerate(self._criterias_kwgs):
-            self.window.criteria[i] = v
+        criteria = getattr(self.window, "criteria", None)
+        if criteria is None:  # Built from a wrapper
+            return self.window
+        if (
+            criteria != self._criterias_kwgs
+        ):  # Restore the criterias changed by the lookups
+            for i, v in enumerate(self._criterias_kwgs):
+                criteria[i] = dict(v)
         return self.window
 
+    def _is_valid(self) -> bool:
+        """
+        Cheap check that the cached wrapper still points to a visible window
+        """
+        handle = self._handle
+        try:
+            if handle:
+                return handleprops.iswindow(handle) and handleprops.isvisible(handle)
+            # Windowless UIA element
+            return bool(self._wrapper.element_info.visible)
+        except Exception:  # The element is gone, COM/win32 errors vary
+            return False
+
+    def _cache(self, wrapper: WinWrapperT):
+        self._wrapper = wrapper
+        self._handle = getattr(wrapper, "handle", None)
+
+    def invalidate(self):
+        """
+        Drop the cached wrapper, it is resolved with the criterias again on the next use
+        """
+        self._wrapper = self._handle = None
+
     @property
     def wrapper(self) -> WinWrapperT:
-        if not self._wrapper:
-            self._wait()
+        if self._wrapper is not None:
+            if self._is_valid():
+                self.stats.revalidated += 1
+                return self._wrapper
+            self.invalidate()
+        self._wait()
         assert self._wrapper
         return self._wrapper
 
+    def rectangle(self):
+        return self.wrapper.rectangle()
+
     def close(self):
         self.wrapper.close()
 
@@ -125,6 +210,45 @@ class Window:
         except TypeError:  # Inner issues in pywinauto. Click is performed anyways
             pass
 
+    def _state_waiter(
+        self,
+        wait_ms: Opt[int],
+        retry_ms: Opt[int],
+        state: str,
+        *,
+        spec: Opt[WindowSpecification] = None,
+    ) -> Tuple[Callable[[], Opt[WinWrapperT]], int, wait.WaitPolicy]:
+        """
+        Single state check of the window (or the child spec), and the wait time and policy for it
+        """
+        wait_ms, retry_ms = wait._init_wait(
+            wait_ms,
+            retry_ms,
+            wait_ms_def=Timings.window_find_timeout * 1000,
+            retry_ms_def=Timings.window_find_retry * 1000,
+        )
+        if spec is None:
+            spec = self.window_spec
+
+        def check_state():
+            # retry_interval is also the timeout of each pywinauto state check, 0 - a single non-blocking check
+            try:
+                return spec.wait(state, timeout=0, retry_interval=0)
+            except timings.TimeoutError:
+                return None
+
+        return check_state, wait_ms, wait._init_policy(retry_ms)
+
+    def _on_waited(self, result: wait.WaitResult, state: str):
+        if not result:
+            raise timings.TimeoutError(
+                f"Window is not {state} in {result.elapsed_ms:.0f} ms"
+            )
+        self.stats.resolved += 1
+        self._cache(result.value)
+        return self
+
+    @metrics.timed("windows.Window._wait")
     def _wait(
         self,
         *,
@@ -135,14 +259,26 @@ class Window:
         """
         General window wait with pywinauto
         """
-        wait = wait_ms / 1000 if wait_ms is not None else Timings.window_find_timeout
-        retry = (
-            retry_ms / 1000
-            if retry_ms is not None and retry_ms < wait
-            else Timings.window_find_retry
+        check_state, wait_ms, policy = self._state_waiter(wait_ms, retry_ms, state)
+        result = wait.wait_until(check_state, wait_ms=wait_ms, policy=policy)
+        return self._on_waited(result, state)
+
+    async def _async_wait(
+        self,
+        *,
+        wait_ms: Opt[int] = None,
+        retry_ms: Opt[int] = None,
+        state: str = WindowState.all(),
+    ):
+        """
+        :meth:`_wait` for asyncio. The checks run in the event loop thread as UIA objects are bound
+        to the thread they are created in
+        """
+        check_state, wait_ms, policy = self._state_waiter(wait_ms, retry_ms, state)
+        result = await wait.async_wait_until(
+            check_state, wait_ms=wait_ms, policy=policy
         )
-        self._wrapper = self.window_spec.wait(state, timeout=wait, retry_interval=retry)
-        return self
+        return self._on_waited(result, state)
 
     def wait(self, *, wait_ms: Opt[int] = None, retry_ms: Opt[int] = None):
         """
@@ -150,6 +286,9 @@ class Window:
         """
         return self._wait(wait_ms=wait_ms, retry_ms=retry_ms)
 
+    async def async_wait(self, *, wait_ms: Opt[int] = None, retry_ms: Opt[int] = None):
+        return await self._async_wait(wait_ms=wait_ms, retry_ms=retry_ms)
+
     def is_visible(self, *, wait_ms: Opt[int] = None, retry_ms: Opt[int] = None):
         try:
             self.wait(wait_ms=wait_ms, retry_ms=retry_ms)
@@ -157,6 +296,15 @@ class Window:
         except timings.TimeoutError:
             return False
 
+    async def async_is_visible(
+        self, *, wait_ms: Opt[int] = None, retry_ms: Opt[int] = None
+    ):
+        try:
+            await self.async_wait(wait_ms=wait_ms, retry_ms=retry_ms)
+            return True
+        except timings.TimeoutError:
+            return False
+
     def is_exist(self, *, wait_ms: Opt[int] = None, retry_ms: Opt[int] = None):
         try:
             self._wait(
@@ -166,49 +314,82 @@ class Window:
         except timings.TimeoutError:
             return False
 
-    @staticmethod
-    def _best_match(name, window: WinWrapperT):
-        for v in window.element_info.__dict__.values():
-            try:
-                if name in v:
-                    return window
-            except TypeError:  # v is not iterable issues
-                return None
+    async def async_is_exist(
+        self, *, wait_ms: Opt[int] = None, retry_ms: Opt[int] = None
+    ):
+        try:
+            await self._async_wait(
+                wait_ms=wait_ms, retry_ms=retry_ms, state=WindowState.exists.value
+            )
+            return True
+        except timings.TimeoutError:
+            return False
+
+    @property
+    def elements(self) -> ElementTree:
+        """
+        Snapshot of the window children, retaken after the TTL or :meth:`ElementTree.invalidate`
+        """
+        if self._elements is None:
+            self._elements = ElementTree(self.window_spec)
+        return self._elements
 
     def child_from_wrapper(self, eleminfo_criteria: Criteria) -> WindowSpecification:
         """
-        Find child window using children() method from BaseWrapper
+        Find child window by the element properties of the window children snapshot.
+        Criteria with fields not matched in-process (control_id, process, found_index, predicate_func,
+        best_match...) are looked up with pywinauto among the window descendants
 
         Try to use :meth:`~windows.WinWindow.child` method first before trying this one.
         """
-        kwargs = eleminfo_criteria.kwargs
+        matcher = eleminfo_criteria.matcher
+        if not matcher.in_process:
+            return self._child_from_pywinauto(matcher)
+        tree = self.elements
 
         def find_child():
-            if "auto_id" in kwargs:
-                kwargs["automation_id"] = kwargs.pop("auto_id")
-            for child in self.window_spec.children():
-                for k, v in kwargs.items():
-                    try:
-                        attr_val = getattr(child.element_info, k)
-                    except AttributeError:
-                        if k == "best_match":
-                            found_child = self._best_match(v, child)
-                            if found_child:
-                                return child
-                    else:
-                        if attr_val == v:
-                            return child
+            record = matcher.first(tree.snapshot())
+            if record is None:  # Retake the snapshot on the next retry
+                tree.invalidate()
+            return record
 
         child = wait.pollwait(find_child)
         assert child, f"Window with criteria={eleminfo_criteria} not found"
         return Desktop(backend="uia").window(handle=child.handle)
 
+    def _child_from_pywinauto(self, matcher: CriteriaMatcher) -> WindowSpecification:
+        info = self.wrapper.element_info
+        kwargs = {
+            **matcher.kwargs,
+            "top_level_only": False,
+            "backend": "uia" if isinstance(info, UIAElementInfo) else "win32",
+        }
+        kwargs.setdefault("parent", info)
+
+        def find_child():
+            try:
+                return find_elements(**kwargs)
+            except MatchError:
+                return None
+
+        children = wait.pollwait(find_child)
+        assert children, f"Window with criteria={kwargs} not found"
+        return Desktop(backend="uia").window(handle=children[0].handle)
+
+    @metrics.timed("windows.Window.child")
     def child(self, criteria: Criteria) -> WinWrapperT:
         if hasattr(self.window_spec, "child_window"):
             child = self.window_spec.window(**criteria.kwargs)
         else:
             child = self.child_from_wrapper(criteria)
-        return child.wait(WindowState.all())
+        state = WindowState.all()
+        check_state, wait_ms, policy = self._state_waiter(None, None, state, spec=child)
+        result = wait.wait_until(check_state, wait_ms=wait_ms, policy=policy)
+        if not result:
+            raise timings.TimeoutError(
+                f"Child window with criteria={criteria} is not {state} in {result.elapsed_ms:.0f} ms"
+            )
+        return result.value
 
     def select_combobox(self, text: str, expand_btn_criteria: Criteria):
         """
@@ -243,28 +424,66 @@ class Window:
     def get_text(self, criteria: Criteria):
         return self.child(criteria).element_info.rich_text
 
-    def set_text(self, text: str, criteria: Opt[Criteria] = None):
+    def set_text(
+        self,
+        text: str,
+        criteria: Opt[Criteria] = None,
+        *,
+        strategy: Opt[str] = None,
+    ):
         wrapper = self.child(criteria) if criteria is not None else self.wrapper
-        self.set_text_to_wrapper(text, wrapper)
+        self.set_text_to_wrapper(text, wrapper, strategy=strategy)
         return self
 
     def set_text_to_wrapper(
-        self, text: str, input_wrapper: WinWrapperT, *, press_enter=False
+        self,
+        text: str,
+        input_wrapper: WinWrapperT,
+        *,
+        press_enter=False,
+        strategy: Opt[str] = None,
     ):
         """
-        Set text into wrapper input object directly
+        Set text into wrapper input object directly, typed or pasted, see :func:`textentry.choose`.
+        The pasted text is inserted as is and verified with the input value (except the password inputs),
+        the typed one is interpreted as pywinauto keys. "auto" types the texts with pywinauto key syntax
+
+        :param strategy: "auto", "type" or "paste", [project-configuration.text-entry] strategy by default
         """
         input_wrapper.set_focus()
-        time.sleep(
-            0.3
-        )  # Minor wait to respect consequential typing into several inputs
-        input_wrapper.type_keys(text + ("~" if press_enter else ""), with_spaces=True)
+        # Wait to respect consequential typing into several inputs
+        timing.pause(
+            timing.current().before_type_wait, input_wrapper.has_keyboard_focus
+        )
+        info = input_wrapper.element_info
+        textentry.enter_text(
+            text,
+            type_text=lambda t: input_wrapper.type_keys(t, with_spaces=True),
+            send_paste=lambda: input_wrapper.type_keys("^v"),
+            strategy=strategy,
+            read_back=None if _is_password(info) else lambda: _input_value(info),
+            key_syntax=True,
+        )
+        if press_enter:
+            input_wrapper.type_keys("~")
 
     def focus(self):
         """
-        Focus with lower timeout to not wait for the agent with the hidden (implicit) tracking
+        Focus with lower timeout to not wait for the agent with the hidden (implicit) tracking.
+        Nothing is done if the cached window is the foreground one already
         """
-        self.window.wait("visible", Settings.FIND_TIMEOUT).set_focus()
+        if (
+            self._handle
+            and self._handle == win32gui.GetForegroundWindow()
+            and self._is_valid()
+        ):
+            self.stats.focus_skipped += 1
+            return self
+        self._wait(
+            wait_ms=_settings.Settings.FIND_TIMEOUT * 1000,
+            state=WindowState.visible.value,
+        )
+        self._wrapper.set_focus()
         return self
 
 
@@ -310,19 +529,70 @@ class App(_App):
             win = win.focus().wait(wait_ms=self._wait_ms)
         return win
 
-    def _close_proc(self, proc_name: str):
-        try:
-            proc.kill_proc(proc_name)
-        except psutil.NoSuchProcess:
-            pass
-        # Static time for safety reason, helps work correctly with other apps after close
-        time.sleep(0.5)
+    @metrics.timed("windows.App._close_proc")
+    def _close_proc(self, proc_name: str) -> proc.ExitReport:
+        """
+        Kill the app process tree and wait until every process is gone, so other apps work correctly after close
+        """
+        wait_ms = self._wait_ms if self._wait_ms is not None else wait.TimeoutMs.mid
+        report = proc.kill_procs([proc_name], timeout=wait_ms / 1000)
+        if report.alive:
+            log.warning(
+                f"Processes of {proc_name} are alive after close: {report.alive}"
+            )
+        log.debug(f"Closed {proc_name}, exit ms by pid: {report.exit_ms}")
+        return report
 
-    def close(self):
+    def close(self) -> Opt[proc.ExitReport]:
         if self.proc_name:
-            self._close_proc(self.proc_name)
+            return self._close_proc(self.proc_name)
+
+
+# Top-level windows shared by the window lookups within the TTL
+top_windows = TopWindowIndex(
+    lambda: find_elements(top_level_only=True, visible_only=False)
+)
+
 
+@functools.lru_cache(maxsize=None)
+def _desktop() -> Desktop:
+    return Desktop()
 
+
+# Edit control style of the password inputs
+_ES_PASSWORD = 0x0020
+
+
+def _is_password(info) -> bool:
+    """
+    The input hides its value, so element_info.rich_text does not show the typed text
+    """
+    element = getattr(info, "element", None)  # UIA element
+    if element is not None:
+        return bool(getattr(element, "CurrentIsPassword", False))
+    return info.class_name == "Edit" and bool(
+        handleprops.style(info.handle) & _ES_PASSWORD
+    )
+
+
+def _input_value(info) -> Opt[str]:
+    """
+    Text of the input, None if it is not exposed. UIA element_info.rich_text falls back to the name
+    """
+    element = getattr(info, "element", None)  # UIA element
+    if element is None:
+        return info.rich_text
+    try:
+        return get_elem_interface(element, "Value").CurrentValue
+    except Exception:
+        pass
+    try:
+        return get_elem_interface(element, "Text").DocumentRange.GetText(-1)
+    except Exception:
+        return None
+
+
+@metrics.timed("windows.find_window")
 def find_window(
     *,
     wrapper_predicate: Opt[Callable[[HwndElementInfo], bool]] = None,
@@ -330,16 +600,25 @@ def find_window(
 ) -> WindowSpecification:
     """
     Find a Window for the already open application
+
+    Criteria by title, class name, process and visibility flags are looked up in :data:`top_windows`
     """
-    criteria = criteria or Criteria()
+    matcher = (criteria or Criteria()).matcher
 
     def get_elements():
-        try:
-            els = find_elements(**criteria.kwargs)
-        except MatchError:
-            els = []
-        return [e for e in els if wrapper_predicate(e)] if wrapper_predicate else els
-
-    wait.pollwait(get_elements)
-    wrapper = get_elements()[0]
-    return Desktop().window(handle=wrapper.handle)
+        if matcher.window_indexable:
+            els = [r.element_info for r in top_windows.find(matcher)]
+        else:
+            try:
+                els = find_elements(**matcher.kwargs)
+            except MatchError:
+                els = []
+        if wrapper_predicate:
+            els = [e for e in els if wrapper_predicate(e)]
+        if not els and matcher.window_indexable:  # Enumerate again on the next retry
+            top_windows.invalidate()
+        return els
+
+    elements = wait.pollwait(get_elements)
+    assert elements, f"Window with criteria={criteria} not found"
+    return _desktop().window(handle=elements[0].handle)
@@ -0,0 +1,61 @@
+"""
+Test tools (pyautogui, pywinauto, airtest) imported lazily and configured from the TOML configuration
+"""
+
+from types import ModuleType
+
+from deskapptest.utils import conf, timing
+from deskapptest.utils.lazy import LazyModule
+
+
+def _setup_pyautogui(pyautogui: ModuleType):
+    # Prevents the error on virtual machines
+    pyautogui.FAILSAFE = False
+
+
+def _setup_pywinauto(timings: ModuleType):
+    Timings = timings.Timings
+    Timings.after_sendkeys_key_wait = conf.read_toml(
+        "pywinauto-configuration", "after_sendkeys_key_wait"
+    )
+    # The key from before the timing profiles still wins if a project sets it
+    Timings.after_clickinput_wait = conf.read_toml(
+        "pywinauto-configuration",
+        "after_clickinput_wait",
+        default=timing.current().after_clickinput_wait,
+    )
+    Timings.window_find_timeout = conf.read_toml(
+        "pywinauto-configuration", "window_find_timeout"
+    )
+    Timings.window_find_retry = conf.read_toml(
+        "pywinauto-configuration", "window_find_retry"
+    )
+
+
+def _setup_airtest(settings: ModuleType):
+    Settings = settings.Settings
+    Settings.FIND_TIMEOUT = conf.read_toml("airtest-configuration", "find_timeout")
+    Settings.THRESHOLD = conf.read_toml("airtest-configuration", "threshold")
+    Settings.CVSTRATEGY = conf.read_toml("airtest-configuration", "cvstrategy")
+    # airtest resolves the strategies in its MATCHING_METHODS, register the own ones there,
+    # so CVSTRATEGY set later in the code works too
+    from deskapptest.utils import pyramid
+
+    pyramid.register()
+
+
+# Heavy backends are imported and configured on the first use
+pyautogui = LazyModule("pyautogui", on_load=_setup_pyautogui)
+timings = LazyModule("pywinauto.timings", on_load=_setup_pywinauto)
+settings = LazyModule("airtest.core.settings", on_load=_setup_airtest)
+
+
+def configure(*, force: bool = False):
+    """
+    Import pyautogui, airtest, pywinauto and apply the tools configuration.
+
+    Is done implicitly on the first use of each tool, call explicitly to pay the import cost upfront
+    or with force=True to re-apply the configuration after it was changed.
+    """
+    for module in (pyautogui, timings, settings):
+        module.reconfigure() if force else module.load()
@@ -1,8 +1,20 @@
 import sys
 import os
+import time
+import functools
+import threading
 import configparser
 from pathlib import Path
-from typing import MutableMapping, Optional as Opt, Union
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    MutableMapping,
+    NamedTuple,
+    Optional as Opt,
+    Tuple,
+    Union,
+)
 
 OLD_PY_VERSION = sys.version_info < (3, 11)
 
@@ -32,36 +44,292 @@ def _getval(conf: Opt[MutableMapping], section: str, prop: str):
     return sect_data.get(prop)
 
 
-def _get_toml_val(conf, section, prop):
-    if not conf.exists():
-        return None
-    with open(conf, "r" if OLD_PY_VERSION else "rb") as f:
-        local_conf = tomllib.load(f)
-    return _getval(local_conf, section, prop)
+class CacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    loads: int
+    checks: int
+
+
+def _load_toml(path: Path) -> MutableMapping:
+    with open(path, "r" if OLD_PY_VERSION else "rb") as f:
+        return tomllib.load(f)
+
+
+def _load_ini(path: Path) -> configparser.ConfigParser:
+    conf = configparser.ConfigParser()
+    conf.read(path)
+    return conf
+
+
+class _FileLayer:
+    """
+    Single parsed config file which is reloaded only when the file mtime or size is changed
+    """
+
+    def __init__(self, path: Path, loader: Callable[[Path], Any]):
+        self.path = path
+        self.data: Any = None
+        self._loader = loader
+        self._signature: Opt[Tuple[int, int]] = None
+
+    def _stat(self) -> Opt[Tuple[int, int]]:
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def refresh(self) -> bool:
+        """
+        Reload the file if it was changed since the last load. Return True if the layer data is changed
+        """
+        signature = self._stat()
+        if signature == self._signature:
+            return False
+        self._signature = signature
+        self.data = None if signature is None else self._loader(self.path)
+        return True
+
+
+class _LayeredFiles:
+    """
+    Several config files where the latter files override the former ones.
+
+    Files are checked for changes (mtime, size) not more often than once per check_interval seconds,
+    so the hot path does not touch the disk.
+    """
+
+    def __init__(
+        self,
+        *paths: Path,
+        loader: Callable[[Path], Any],
+        check_interval: float = 2.0,
+    ):
+        self._layers = [_FileLayer(p, loader) for p in paths]
+        self._check_interval = check_interval
+        self._checked_at: Opt[float] = None
+        self._values: Dict[Any, Any] = {}
+        self._lock = threading.Lock()
+        self._hits = self._misses = self._loads = self._checks = 0
+
+    def _rebuild(self):
+        """
+        Called when any of the layers is changed
+        """
+        self._values = {}
+
+    def refresh(self, *, force: bool = False):
+        """
+        Re-check the layer files and rebuild the cached values if any of them is changed
+        """
+        now = time.monotonic()
+        if (
+            not force
+            and self._checked_at is not None
+            and now - self._checked_at < self._check_interval
+        ):
+            return
+        with self._lock:
+            self._checked_at = now
+            self._checks += 1
+            changed = [layer.refresh() for layer in self._layers]
+            if any(changed):
+                self._loads += sum(changed)
+                self._rebuild()
+
+    def _cached(self, key, compute: Callable[[], Any]):
+        self.refresh()
+        try:
+            val = self._values[key]
+        except KeyError:
+            self._misses += 1
+            val = compute()
+            if val is not None:
+                self._values[key] = val
+        else:
+            self._hits += 1
+        return val
 
+    def cache_info(self) -> CacheInfo:
+        return CacheInfo(self._hits, self._misses, self._loads, self._checks)
 
-def read_toml(section: str, prop: str):
+
+def _merge(base: MutableMapping, override: MutableMapping) -> MutableMapping:
+    """
+    Merge override layer into base. A value from the override layer is selected only if it is set
+    (not an empty string), so 0 and false are valid overrides
+    """
+    merged = dict(base)
+    for k, v in override.items():
+        if isinstance(v, MutableMapping) and isinstance(merged.get(k), MutableMapping):
+            merged[k] = _merge(merged[k], v)
+        elif v != "":
+            merged[k] = v
+    return merged
+
+
+class LayeredToml(_LayeredFiles):
+    """
+    Process-wide view over several TOML files. Each file is parsed once and the layers are merged once,
+    so the property lookup is a dictionary lookup.
+    """
+
+    def __init__(self, *paths: Path, check_interval: float = 2.0):
+        self._merged: MutableMapping = {}
+        super().__init__(*paths, loader=_load_toml, check_interval=check_interval)
+
+    def _rebuild(self):
+        merged: MutableMapping = {}
+        for layer in self._layers:
+            merged = _merge(merged, layer.data or {})
+        self._merged = merged
+        super()._rebuild()
+
+    def get(self, section: str, prop: str):
+        return self._cached(
+            (section, prop), lambda: _getval(self._merged, section, prop)
+        )
+
+
+_toml: Opt[LayeredToml] = None
+
+
+def _get_toml() -> LayeredToml:
+    global _toml
+    if _toml is None:
+        lib_toml = Path(__file__).parent.parent.joinpath(_CONFIG_TOML_NAME).resolve()
+        assert lib_toml.exists(), "testapptest lib does not include config.toml"
+        project_toml = _PROJECT_ROOT.joinpath(_TOML_NAME)
+        local_project_toml = project_toml.with_name("_" + project_toml.name)
+        _toml = LayeredToml(lib_toml, project_toml, local_project_toml)
+    return _toml
+
+
+# Marks read_toml properties without a default
+_REQUIRED = object()
+
+
+def read_toml(section: str, prop: str, default: Any = _REQUIRED):
     """
     Grab the value of the property from pyproject.toml configuration file checking the scope of the file:
     1 priority - local version _pyproject.toml in the project root
     2 priority - pyproject.toml in the project root
     3 priority - pyproject.toml in the deskapptest lib root
+
+    Files are parsed once per process and re-read only when changed, see :class:`LayeredToml`
+
+    :param default: Value of a missing property, the property is required if not set
+    """
+    v = _get_toml().get(section, prop)
+    if v is None and default is not _REQUIRED:
+        return default
+    assert v is not None, "testapptest lib configs are not set"
+    return v
+
+
+def toml_cache_info() -> CacheInfo:
     """
-    lib_toml = Path(__file__).parent.parent.joinpath(_CONFIG_TOML_NAME).resolve()
-    assert lib_toml, "testapptest lib does not include pyproject.toml"
-    project_toml = _PROJECT_ROOT.joinpath(_TOML_NAME)
-    local_project_toml = project_toml.with_name("_" + project_toml.name)
-    lib_v = _get_toml_val(lib_toml, section, prop)
-    v = _get_toml_val(project_toml, section, prop)
-    local_v = _get_toml_val(local_project_toml, section, prop)
+    Hit/miss counters of :func:`read_toml` lookups, number of file loads and file change checks
+    """
+    return _get_toml().cache_info()
+
+
+@functools.lru_cache(maxsize=None)
+def _login() -> str:
+    return os.getlogin()
+
+
+def _env_val(section: str, prop: str) -> Opt[str]:
+    """
+    {section}_{prop} env variable. Matched case-insensitively, configparser lowercases the property names
+    """
+    name = f"{section}_{prop}"
+    val = os.environ.get(name)
+    if val is None:
+        name = name.lower()
+        val = next((v for k, v in os.environ.items() if k.lower() == name), None)
+    return val
+
+
+def _resolve_ini_val(section: str, prop: str, val: str) -> str:
+    # Value from env sys variable is prioritized
+    env_val = _env_val(section, prop)
+    if env_val is not None:
+        val = env_val
+    # Common pattern to insert a PC user
+    if "<user>" in val:
+        val = val.replace("<user>", _login())
+    return val
+
+
+class IniResolver(_LayeredFiles):
+    """
+    Main .ini file with its local "_" prefixed version. Both files are parsed once and re-read only when changed
+    """
+
+    def __init__(self, ini: Path, *, check_interval: float = 2.0):
+        self.ini = ini
+        super().__init__(
+            ini,
+            ini.with_name("_" + ini.name),
+            loader=_load_ini,
+            check_interval=check_interval,
+        )
+
+    def _file_val(self, section: str, prop: str) -> Opt[str]:
+        main_layer, local_layer = self._layers
+        # Check if need to override properties with local ini
+        local_v = _getval(local_layer.data, section, prop)
+        # If not found local property - use from the main ini
+        return _getval(main_layer.data, section, prop) if local_v is None else local_v
+
+    def _file_section(self, section: str) -> Opt[Dict[str, str]]:
+        found = None
+        for layer in self._layers:
+            conf = layer.data
+            if conf is None or not (
+                conf.has_section(section) or section == configparser.DEFAULTSECT
+            ):
+                continue
+            found = found or {}
+            found.update(conf[section])
+        return found
+
+    def get(self, section: str, prop: str) -> str:
+        val = _env_val(section, prop)
+        if val is None:
+            val = self._cached((section, prop), lambda: self._file_val(section, prop))
+        assert (
+            val is not None
+        ), f"No property={prop} found in the section={section} from the ini config file={self.ini}"
+        return _resolve_ini_val(section, prop, val)
+
+    def get_section(self, section: str) -> Dict[str, str]:
+        vals = self._cached(section, lambda: self._file_section(section))
+        assert (
+            vals is not None
+        ), f"No section={section} found in the ini config file={self.ini}"
+        return {k: _resolve_ini_val(section, k, v) for k, v in vals.items()}
+
+
+_ini_resolvers: Dict[Path, IniResolver] = {}
 
-    if local_v:
-        return local_v
-    elif v:
-        return v
-    else:
-        assert lib_v, "testapptest lib configs are not set"
-        return lib_v
+
+def _ini_path(inifile_path: Union[str, Path]) -> Path:
+    # Check if search ini by absolute path
+    ini = Path(inifile_path)
+    if not ini.is_absolute():
+        ini = _PROJECT_ROOT.joinpath("resources", "config", inifile_path)
+    return ini
+
+
+def get_ini_resolver(inifile_path: Union[str, Path]) -> IniResolver:
+    ini = _ini_path(inifile_path)
+    try:
+        return _ini_resolvers[ini]
+    except KeyError:
+        return _ini_resolvers.setdefault(ini, IniResolver(ini))
 
 
 def read_ini(
@@ -77,30 +345,14 @@ def read_ini(
 
     - Value gained from env sys env variable would be prioritized
     """
-    conf = configparser.ConfigParser()
+    return get_ini_resolver(inifile_path).get(section, prop)
 
-    # Check if search ini by absolute path
-    ini = Path(inifile_path)
-    if not ini.is_absolute():
-        ini = _PROJECT_ROOT.joinpath("resources", "config", inifile_path)
-
-    conf.read(ini)
 
-    # Check if local ini exists
-    local_conf = None
-    local_ini = ini.with_name("_" + ini.name)
-    if local_ini.exists():
-        local_conf = configparser.ConfigParser()
-        local_conf.read(local_ini)
-
-    # Check if need to override properties with local ini
-    local_v = _getval(local_conf, section, prop)
-    # If not found local property - use from the main ini
-    val = _getval(conf, section, prop) if local_v is None else local_v
-    assert (
-        val is not None
-    ), f"No property={prop} found in the section={section} from the ini config file={ini}"
-
-    # Common pattern to insert a PC user
-    val = val.replace("<user>", os.getlogin())
-    return val
+def read_ini_section(
+    inifile_path: Union[str, Path],
+    section: str,
+) -> Dict[str, str]:
+    """
+    Read all the properties of the section at once. Values are resolved the same way as in :func:`read_ini`
+    """
+    return get_ini_resolver(inifile_path).get_section(section)
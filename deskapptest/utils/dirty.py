@@ -0,0 +1,143 @@
+"""
+Changed screen areas between the frames grabbed by the template search retries
+"""
+
+from __future__ import annotations
+
+import math
+import threading
+from typing import TYPE_CHECKING, List, NamedTuple, Optional as Opt
+
+from deskapptest.utils import conf
+from deskapptest.utils.frames import Rect
+from deskapptest.utils.lazy import LazyModule
+
+if TYPE_CHECKING:
+    import numpy
+
+np = LazyModule("numpy")
+cv2 = LazyModule("cv2")
+
+
+class TileStats(NamedTuple):
+    frames: int
+    # Frames without any changes, the matching is skipped for them
+    frames_skipped: int
+    tiles: int
+    tiles_skipped: int
+
+
+class _Counters:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.frames = self.frames_skipped = self.tiles = self.tiles_skipped = 0
+
+    def add(self, tiles: int, changed: int):
+        with self._lock:
+            self.frames += 1
+            self.frames_skipped += not changed
+            self.tiles += tiles
+            self.tiles_skipped += tiles - changed
+
+    def stats(self) -> TileStats:
+        return TileStats(
+            self.frames, self.frames_skipped, self.tiles, self.tiles_skipped
+        )
+
+
+_counters = _Counters()
+
+
+def tile_stats() -> TileStats:
+    """
+    Process-wide counters of the compared frames and tiles
+    """
+    return _counters.stats()
+
+
+def reset_tile_stats():
+    _counters.reset()
+
+
+class DirtyTiles:
+    """
+    Compare each frame with the previous one pixel by pixel, a tile x tile pixel block is changed
+    if any of its pixels is changed
+
+    Usage:
+    tracker = DirtyTiles()
+    tracker.update(frame)  # None - the first frame, match the whole frame
+    tracker.regions(template_w, template_h)  # Areas to match for the later frames, empty if nothing is changed
+    """
+
+    def __init__(self, tile: Opt[int] = None):
+        self.tile = tile or conf.read_toml(
+            "project-configuration.dirty-tiles", "tile_px"
+        )
+        # Copy of the previous frame, the grabbed frames are reused by the sources
+        self._prev: Opt[numpy.ndarray] = None
+        self._mask: Opt[numpy.ndarray] = None
+        self._shape = None
+
+    def _tiles_max(self, diff: numpy.ndarray) -> numpy.ndarray:
+        """
+        Max of the pixel (and channel) differences in each tile. The frame is padded to whole tiles
+        and reduced by the rows of the tiles first, both reductions run over contiguous memory
+        """
+        h, w = diff.shape[:2]
+        th, tw = math.ceil(h / self.tile), math.ceil(w / self.tile)
+        padded = cv2.copyMakeBorder(
+            diff, 0, th * self.tile - h, 0, tw * self.tile - w, cv2.BORDER_CONSTANT
+        )
+        rows = padded.reshape(th, self.tile, -1).max(axis=1)
+        return rows.reshape(th, tw, -1).max(axis=2)
+
+    def update(self, frame: numpy.ndarray) -> Opt[numpy.ndarray]:
+        """
+        Store the frame. Return mask of the changed tiles or None if there is no previous frame to compare with
+        """
+        prev = self._prev
+        if prev is None or prev.shape != frame.shape:
+            self._prev = frame.copy()
+            self._shape = frame.shape
+            self._mask = None
+            return None
+        diff = cv2.absdiff(frame, prev)
+        np.copyto(prev, frame)
+        mask = self._tiles_max(diff) > 0
+        self._mask = mask
+        _counters.add(mask.size, int(np.count_nonzero(mask)))
+        return mask
+
+    def regions(self, margin_w: int, margin_h: int) -> Opt[List[Rect]]:
+        """
+        Frame areas covering the changed tiles extended by the margin (the template size), so that any template
+        placement overlapping a changed tile is inside one of the areas.
+        None if the whole frame should be matched
+        """
+        if self._mask is None:
+            return None
+        if not self._mask.any():
+            return []
+        mx, my = math.ceil(margin_w / self.tile), math.ceil(margin_h / self.tile)
+        dilated = cv2.dilate(
+            self._mask.astype(np.uint8),
+            np.ones((2 * my + 1, 2 * mx + 1), dtype=np.uint8),
+        )
+        count, _, stats, _ = cv2.connectedComponentsWithStats(dilated, connectivity=8)
+        h, w = self._shape[:2]
+        regions = []
+        # Plain ints, numpy ones leak into the match positions and break their JSON dumps
+        for x, y, tw, th, _ in stats[1:count].tolist():
+            regions.append(
+                Rect(
+                    x * self.tile,
+                    y * self.tile,
+                    min(w, (x + tw) * self.tile),
+                    min(h, (y + th) * self.tile),
+                )
+            )
+        return regions
@@ -0,0 +1,364 @@
+from __future__ import annotations
+
+import abc
+import glob
+import os
+import tempfile
+import threading
+import time
+from typing import (
+    TYPE_CHECKING,
+    List,
+    NamedTuple,
+    Optional as Opt,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+from deskapptest.utils import conf, metrics
+from deskapptest.utils.backends import pyautogui
+from deskapptest.utils.lazy import LazyModule
+
+if TYPE_CHECKING:
+    import numpy
+
+np = LazyModule("numpy")
+cv2 = LazyModule("cv2")
+_mss = LazyModule("mss")
+
+
+class Rect(NamedTuple):
+    """
+    Screen rectangle in pixels, right and bottom are exclusive
+    """
+
+    left: int
+    top: int
+    right: int
+    bottom: int
+
+    @property
+    def width(self) -> int:
+        return self.right - self.left
+
+    @property
+    def height(self) -> int:
+        return self.bottom - self.top
+
+
+def crop(frame: numpy.ndarray, region: Opt[Rect]) -> numpy.ndarray:
+    """
+    Zero-copy view of the frame region clamped to the frame size
+    """
+    if region is None:
+        return frame
+    h, w = frame.shape[:2]
+    left, top = max(0, region.left), max(0, region.top)
+    right, bottom = min(w, region.right), min(h, region.bottom)
+    return frame[top : max(top, bottom), left : max(left, right)]
+
+
+class FrameSource(abc.ABC):
+    """
+    Source of BGR uint8 frames (H, W, 3) used for the template matching
+
+    A frame is valid until the next grab of the same source, copy it to keep.
+    """
+
+    @abc.abstractmethod
+    def grab(self, region: Opt[Rect] = None) -> numpy.ndarray:
+        pass
+
+    def size(self) -> Tuple[int, int]:
+        """
+        Full frame (width, height)
+        """
+        h, w = self.grab().shape[:2]
+        return w, h
+
+    def clock(self) -> float:
+        """
+        Seconds of the source time, the template search deadlines are measured with it
+        """
+        return time.monotonic()
+
+    def sleep(self, seconds: float):
+        """
+        Wait between the template search retries
+        """
+        time.sleep(seconds)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ScreenSource(FrameSource):
+    """
+    Desktop frames grabbed with mss.
+
+    Only the region is copied from the screen (BitBlt on Windows), the BGRA pixels are converted into
+    a BGR buffer reused by the next grabs of the same size. The grabbers and the buffers are per thread,
+    the GDI handles of mss can't be shared between threads.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def grab(self, region: Opt[Rect] = None) -> numpy.ndarray:
+        local = self._local
+        sct = getattr(local, "sct", None)
+        if sct is None:
+            sct = local.sct = _mss.mss()
+        if region is None:
+            monitor = sct.monitors[1]  # Primary screen
+        else:
+            monitor = {
+                "left": region.left,
+                "top": region.top,
+                "width": region.width,
+                "height": region.height,
+            }
+        shot = sct.grab(monitor)
+        h, w = shot.height, shot.width
+        bgra = np.frombuffer(shot.raw, dtype=np.uint8).reshape(h, w, 4)
+        frame = getattr(local, "frame", None)
+        if frame is None or frame.shape[:2] != (h, w):
+            frame = local.frame = np.empty((h, w, 3), dtype=np.uint8)
+        cv2.cvtColor(bgra, cv2.COLOR_BGRA2BGR, dst=frame)
+        return frame
+
+    def close(self):
+        sct = getattr(self._local, "sct", None)
+        if sct is not None:
+            sct.close()
+        self._local = threading.local()
+
+    def size(self) -> Tuple[int, int]:
+        # Primary screen metrics (pyautogui is DPI aware as mss), no frame is grabbed
+        w, h = pyautogui.size()
+        return w, h
+
+
+class ArraySource(FrameSource):
+    """
+    In-memory BGR frame, e.g. synthetic screens to test template matching without a desktop
+    """
+
+    def __init__(self, frame: numpy.ndarray):
+        assert (
+            frame.ndim == 3 and frame.shape[2] == 3 and frame.dtype == np.uint8
+        ), f"BGR uint8 frame is expected, got shape={frame.shape} dtype={frame.dtype}"
+        self.frame = frame
+
+    def grab(self, region: Opt[Rect] = None) -> numpy.ndarray:
+        return crop(self.frame, region)
+
+    def size(self) -> Tuple[int, int]:
+        h, w = self.frame.shape[:2]
+        return w, h
+
+
+def read_frame(path: Union[str, os.PathLike]) -> numpy.ndarray:
+    """
+    Read an image file into a BGR frame (non-ASCII paths are supported)
+    """
+    frame = cv2.imdecode(np.fromfile(os.fspath(path), dtype=np.uint8), cv2.IMREAD_COLOR)
+    assert frame is not None, f"Image file={path} can not be read"
+    return frame
+
+
+class ImageFileSource(ArraySource):
+    """
+    Image file which is read once and returned as the frame on every grab
+    """
+
+    def __init__(self, path: Union[str, os.PathLike]):
+        self.path = path
+        super().__init__(read_frame(path))
+
+
+def save_frame(frame: numpy.ndarray, path: Opt[Union[str, os.PathLike]] = None) -> str:
+    """
+    Save the frame into the image file (PNG by default). Return the file path
+    """
+    if path is None:
+        fh, path = tempfile.mkstemp(".png")
+        os.close(fh)
+    path = os.fspath(path)
+    ok, encoded = cv2.imencode(os.path.splitext(path)[1] or ".png", frame)
+    assert ok, f"Frame can not be encoded into file={path}"
+    encoded.tofile(path)
+    return path
+
+
+class ReplaySource(FrameSource):
+    """
+    Recorded frames replayed on a virtual clock. A grab returns the frame recorded at the clock time,
+    the search retries advance the clock instead of sleeping, so a recording is searched at CPU speed
+    as if it was polled live. The last frame is returned after the end of the recording
+
+    Usage:
+    with DirectorySource("session/") as source:
+        find_template(ok_btn, source=source, wait_ms=5000)
+        source.clock()  # Recording time the button is found at
+    """
+
+    def __init__(self, *, interval_ms: Opt[float] = None):
+        """
+        :param interval_ms: Time between the recorded frames, [project-configuration.replay] interval_ms by default
+        """
+        self.interval_ms = interval_ms or conf.read_toml(
+            "project-configuration.replay", "interval_ms"
+        )
+        self._now = 0.0
+        self._index = -1
+        self._frame: Opt[numpy.ndarray] = None
+        self.exhausted = False
+
+    @abc.abstractmethod
+    def _read(self, index: int) -> Opt[numpy.ndarray]:
+        """
+        Frame with the index or None after the end. Indexes grow until :meth:`rewind`
+        """
+
+    def _current(self) -> numpy.ndarray:
+        index = int(self._now * 1000 // self.interval_ms)
+        if index > self._index and not self.exhausted:
+            frame = self._read(index)
+            if frame is None:
+                self.exhausted = True
+            else:
+                self._frame, self._index = frame, index
+        assert self._frame is not None, f"No frames in {self}"
+        return self._frame
+
+    def grab(self, region: Opt[Rect] = None) -> numpy.ndarray:
+        return crop(self._current(), region)
+
+    def size(self) -> Tuple[int, int]:
+        h, w = self._current().shape[:2]
+        return w, h
+
+    def clock(self) -> float:
+        return self._now
+
+    def sleep(self, seconds: float):
+        self._now += max(0.0, seconds)
+
+    def rewind(self):
+        """
+        Replay from the first frame
+        """
+        self._now = 0.0
+        self._index = -1
+        self._frame = None
+        self.exhausted = False
+
+
+class SequenceSource(ReplaySource):
+    """
+    In-memory frames replayed one per interval
+    """
+
+    def __init__(
+        self, frames: Sequence[numpy.ndarray], *, interval_ms: Opt[float] = None
+    ):
+        super().__init__(interval_ms=interval_ms)
+        self.frames = frames
+
+    def _read(self, index: int) -> Opt[numpy.ndarray]:
+        return self.frames[index] if index < len(self.frames) else None
+
+
+class DirectorySource(ReplaySource):
+    """
+    Image files of the directory replayed one per interval in the file name order
+    """
+
+    def __init__(
+        self,
+        dir: Union[str, os.PathLike],
+        *,
+        pattern: str = "*.png",
+        interval_ms: Opt[float] = None,
+    ):
+        super().__init__(interval_ms=interval_ms)
+        self.paths: List[str] = sorted(
+            glob.glob(os.path.join(glob.escape(os.fspath(dir)), pattern))
+        )
+
+    def _read(self, index: int) -> Opt[numpy.ndarray]:
+        return read_frame(self.paths[index]) if index < len(self.paths) else None
+
+
+class VideoSource(ReplaySource):
+    """
+    Video file frames replayed at the video frame rate. Frames are decoded sequentially,
+    the skipped ones are only grabbed
+    """
+
+    def __init__(
+        self, path: Union[str, os.PathLike], *, interval_ms: Opt[float] = None
+    ):
+        self.path = os.fspath(path)
+        self._capture = self._open()
+        fps = self._capture.get(cv2.CAP_PROP_FPS)
+        super().__init__(interval_ms=interval_ms or (1000 / fps if fps > 0 else None))
+        self._next = 0
+
+    def _open(self):
+        capture = cv2.VideoCapture(self.path)
+        assert capture.isOpened(), f"Video file={self.path} can not be opened"
+        return capture
+
+    def _read(self, index: int) -> Opt[numpy.ndarray]:
+        while self._next < index:
+            if not self._capture.grab():
+                return None
+            self._next += 1
+        ok, frame = self._capture.read()
+        self._next += 1
+        return frame if ok else None
+
+    def rewind(self):
+        super().rewind()
+        self._capture.release()
+        self._capture = self._open()
+        self._next = 0
+
+    def close(self):
+        self._capture.release()
+
+
+_source: Opt[FrameSource] = None
+
+
+def get_source() -> FrameSource:
+    global _source
+    if _source is None:
+        _source = ScreenSource()
+    return _source
+
+
+def set_source(source: Opt[FrameSource]) -> Opt[FrameSource]:
+    """
+    Replace the default frame source (the desktop), None restores the default one. Return the previous source
+    """
+    global _source
+    prev, _source = _source, source
+    return prev
+
+
+def grab(region: Opt[Rect] = None, *, source: Opt[FrameSource] = None) -> numpy.ndarray:
+    """
+    Grab the frame from the source, the default one if not set
+    """
+    with metrics.span("frames.grab"):
+        return (source or get_source()).grab(region)
@@ -1,11 +1,59 @@
 import os
 import re
-import shutil
+import time
+import logging as log
 from pathlib import Path
 
-from typing import Callable, List, Optional as Opt, Union
+from typing import (
+    Callable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional as Opt,
+    Pattern,
+    Union,
+)
+from deskapptest.utils import fswatch
+from deskapptest.utils.lazy import LazyModule
 from deskapptest.utils.wait import pollwait
 
+_futures = LazyModule("concurrent.futures")
+
+# Bytes read at once by the streaming reads
+CHUNK_SIZE = 1024 * 1024
+# Files removed by one thread pool task, fewer files are removed without starting the pool
+_DELETE_BATCH = 256
+
+
+def watched_pollwait(
+    dir: Union[str, os.PathLike],
+    predicate_fn: Callable,
+    *,
+    wait_ms: Opt[int] = None,
+    retry_ms: Opt[int] = None,
+    modified: bool = False,
+):
+    """
+    :func:`~deskapptest.utils.wait.pollwait` re-checking the predicate as soon as the directory is changed
+
+    :param modified: Re-check on every write to the directory files as well
+    """
+    if wait_ms == 0:
+        return pollwait(predicate_fn, wait_ms=0, retry_ms=retry_ms)
+    with fswatch.watch(dir, modified=modified) as watcher:
+        return pollwait(
+            predicate_fn, wait_ms=wait_ms, retry_ms=retry_ms, sleep=watcher.wait
+        )
+
+
+def _wait_exists(file, wait_ms: Opt[int], retry_ms: Opt[int]):
+    watched_pollwait(
+        os.path.dirname(os.path.abspath(file)),
+        lambda: os.path.exists(file),
+        wait_ms=wait_ms,
+        retry_ms=retry_ms,
+    )
+
 
 def readfile(
     file, mode, encoding="ansii", *, wait_ms: Opt[int] = None, retry_ms: Opt[int] = None
@@ -13,54 +61,265 @@ def readfile(
     """
     Wait for file to appear and read
     """
-    pollwait(lambda: os.path.exists(file), wait_ms=wait_ms, retry_ms=retry_ms)
+    _wait_exists(file, wait_ms, retry_ms)
     with open(file, mode=mode, encoding=encoding) as f:
         return f.read()
 
 
+def iter_chunks(
+    file,
+    chunk_size: int = CHUNK_SIZE,
+    *,
+    wait_ms: Opt[int] = None,
+    retry_ms: Opt[int] = None,
+) -> Iterator[bytes]:
+    """
+    Wait for file to appear and read it by chunks
+    """
+    _wait_exists(file, wait_ms, retry_ms)
+    with open(file, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+def iter_lines(
+    file,
+    encoding="utf-8",
+    *,
+    wait_ms: Opt[int] = None,
+    retry_ms: Opt[int] = None,
+) -> Iterator[str]:
+    """
+    Wait for file to appear and read it line by line without line endings
+    """
+    _wait_exists(file, wait_ms, retry_ms)
+    with open(file, encoding=encoding, errors="replace", newline=None) as f:
+        for line in f:
+            yield line.rstrip("\n")
+
+
+class LogFollower:
+    """
+    Reader of the lines appended to a growing file since the previous read
+
+    The file is opened only for the reads, so it can be rotated meanwhile. Reading starts over from the beginning
+    if the file is replaced (rotated) or truncated.
+
+    Usage:
+    log = LogFollower("app.log")  # Only the lines written from now on
+    do_something()
+    line = log.wait_for_line(r"Export finished in \d+ ms", wait_ms=10000)
+    """
+
+    def __init__(
+        self,
+        file: Union[str, os.PathLike],
+        *,
+        encoding="utf-8",
+        from_start: bool = False,
+        chunk_size: int = CHUNK_SIZE,
+    ):
+        """
+        :param from_start: Read the existing lines too
+        """
+        self.file = os.path.abspath(file)
+        self.encoding = encoding
+        self.chunk_size = chunk_size
+        self.offset = 0
+        self._file_id = None
+        try:
+            st = os.stat(self.file)
+        except FileNotFoundError:
+            pass
+        else:
+            self._file_id = (st.st_dev, st.st_ino)
+            if not from_start:
+                self.offset = st.st_size
+
+    def _sync(self, st: os.stat_result):
+        file_id = (st.st_dev, st.st_ino)
+        if file_id != self._file_id or st.st_size < self.offset:
+            # Rotated or truncated
+            self._file_id = file_id
+            self.offset = 0
+
+    def iter_new_lines(self) -> Iterator[str]:
+        """
+        Complete lines appended since the previous read, the trailing incomplete line is left for the next read.
+        The offset is moved past each line as it is yielded
+        """
+        try:
+            f = open(self.file, "rb")
+        except FileNotFoundError:  # Rotation is in progress
+            return
+        with f:
+            self._sync(os.fstat(f.fileno()))
+            f.seek(self.offset)
+            pending = b""
+            while True:
+                chunk = f.read(self.chunk_size)
+                if not chunk:
+                    return
+                *lines, pending = (pending + chunk).split(b"\n")
+                for line in lines:
+                    self.offset += len(line) + 1
+                    yield line.rstrip(b"\r").decode(self.encoding, errors="replace")
+
+    def new_lines(self) -> List[str]:
+        return list(self.iter_new_lines())
+
+    def wait_for_line(
+        self,
+        pattern: Union[str, Pattern[str]],
+        *,
+        wait_ms: Opt[int] = None,
+        retry_ms: Opt[int] = None,
+    ) -> Opt[str]:
+        """
+        Wait for a new line matching the pattern (:func:`re.search`), the lines before it are skipped
+
+        :return: The matched line or None if it is not written until the timeout
+        """
+        regex = re.compile(pattern)
+
+        def find_line():
+            for line in self.iter_new_lines():
+                if regex.search(line):
+                    return line
+            return None
+
+        return watched_pollwait(
+            os.path.dirname(self.file),
+            find_line,
+            wait_ms=wait_ms,
+            retry_ms=retry_ms,
+            modified=True,
+        )
+
+
+def scan_files(
+    dir: Union[str, os.PathLike],
+    predicate: Opt[Callable[[os.DirEntry], bool]] = None,
+    *,
+    recursive: bool = False,
+) -> Iterator[os.DirEntry]:
+    """
+    Directory entries (files and directories) matching the predicate, yielded while scanning.
+    Entries cache their type, so `entry.is_dir()` does not stat the file again.
+    Symlinks to directories are not followed. Missing directory yields nothing
+
+    :param recursive: Scan the subdirectories too, a directory is yielded before its content
+    """
+    try:
+        it = os.scandir(dir)
+    except FileNotFoundError:
+        return
+    with it:
+        for entry in it:
+            if predicate is None or predicate(entry):
+                yield entry
+            if recursive and entry.is_dir(follow_symlinks=False):
+                yield from scan_files(entry.path, predicate, recursive=True)
+
+
 def list_files(
     dir: Union[str, os.PathLike],
     predicate: Opt[Callable[[Path], bool]] = None,
     *,
     wait_ms: Opt[int] = 0,
     retry_ms: Opt[int] = None,
+    recursive: bool = False,
 ) -> List[Path]:
     def getfiles():
-        dir_path = Path(dir)
-        if dir_path.exists():
-            return [
-                file
-                for file in Path(dir).iterdir()
-                if (predicate(file) if predicate else True)
-            ]
-        else:
-            return []
+        files = (Path(entry.path) for entry in scan_files(dir, recursive=recursive))
+        return [file for file in files if predicate(file)] if predicate else list(files)
 
-    try:
-        assert pollwait(
+    return (
+        watched_pollwait(
+            dir,
             getfiles,
             wait_ms=wait_ms,
             retry_ms=retry_ms,
         )
-        return getfiles()
-    except AssertionError:
-        return []
+        or []
+    )
+
+
+class ClearStats(NamedTuple):
+    files_removed: int
+    dirs_removed: int
+    bytes_freed: int
+    elapsed_ms: float
+
+
+def _unlink(entry: os.DirEntry) -> int:
+    """
+    Remove the file, return its size or -1 if it is already removed
+    """
+    try:
+        size = entry.stat(follow_symlinks=False).st_size
+        os.unlink(entry.path)
+    except FileNotFoundError:
+        return -1
+    return size
+
+
+def _unlink_batch(entries: List[os.DirEntry]) -> List[int]:
+    return [_unlink(entry) for entry in entries]
 
 
 def clear_dir(
     dir: Union[str, os.PathLike],
     *,
-    exclude_file_regex: Opt[str] = None,
+    exclude_file_regex: Opt[Union[str, Pattern[str]]] = None,
     del_inner_dirs=False,
-):
-    for file in list_files(dir):
-        name = file.name
-        if file.is_dir():
-            if del_inner_dirs:
-                shutil.rmtree(file)
-            else:
-                clear_dir(file, exclude_file_regex=exclude_file_regex)
-        else:
-            if exclude_file_regex and re.search(exclude_file_regex, name):
-                continue
-            file.unlink()
+    workers: Opt[int] = None,
+) -> ClearStats:
+    """
+    Remove the directory files, the inner directories are cleared the same way or removed with del_inner_dirs.
+    Files are removed in parallel by a thread pool
+
+    :param exclude_file_regex: Keep the files with names matching it (:func:`re.search`), not applied to
+        the files of the removed inner directories
+    :param workers: Thread pool size, default one of :class:`~concurrent.futures.ThreadPoolExecutor`
+    """
+    started = time.perf_counter()
+    exclude = re.compile(exclude_file_regex) if exclude_file_regex else None
+    files: List[os.DirEntry] = []
+    dirs: List[str] = []
+
+    def collect(path, removed: bool):
+        for entry in scan_files(path):
+            if entry.is_dir(follow_symlinks=False):
+                inner_removed = removed or del_inner_dirs
+                collect(entry.path, inner_removed)
+                if inner_removed:
+                    dirs.append(entry.path)  # After its content
+            elif removed or not (exclude and exclude.search(entry.name)):
+                files.append(entry)
+
+    collect(dir, False)
+    if len(files) < _DELETE_BATCH:
+        sizes = _unlink_batch(files)
+    else:
+        batches = [
+            files[i : i + _DELETE_BATCH] for i in range(0, len(files), _DELETE_BATCH)
+        ]
+        with _futures.ThreadPoolExecutor(max_workers=workers) as pool:
+            sizes = [
+                size for batch in pool.map(_unlink_batch, batches) for size in batch
+            ]
+    for path in dirs:
+        os.rmdir(path)
+
+    stats = ClearStats(
+        sum(size >= 0 for size in sizes),
+        len(dirs),
+        sum(size for size in sizes if size > 0),
+        (time.perf_counter() - started) * 1000,
+    )
+    log.debug(f"Cleared dir={dir}: {stats}")
+    return stats
@@ -0,0 +1,136 @@
+"""
+Directory change notifications to wake the file waits up right away instead of the next retry
+
+inotify is used on Linux, other platforms fall back to sleeping the retry interval.
+"""
+
+import abc
+import math
+import os
+import select
+import sys
+import time
+import logging as log
+from typing import Optional as Opt, Union
+
+from deskapptest.utils.conf import read_toml
+from deskapptest.utils.lazy import LazyModule
+
+ctypes = LazyModule("ctypes")
+
+AUTO = "auto"
+INOTIFY = "inotify"
+POLLING = "polling"
+
+# inotify(7) events: a file is created, moved in, completely written, removed or moved out
+_IN_MODIFY = 0x002
+_IN_CLOSE_WRITE = 0x008
+_IN_MOVED_FROM = 0x040
+_IN_MOVED_TO = 0x080
+_IN_CREATE = 0x100
+_IN_DELETE = 0x200
+_IN_MASK = _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE
+
+_libc = None
+
+
+class Watcher(abc.ABC):
+    """
+    Sleeper for :func:`~deskapptest.utils.wait.wait_until` returning earlier if the watched directory is changed
+
+    Usage:
+    with watch(dir) as watcher:
+        pollwait(lambda: os.path.exists(file), sleep=watcher.wait)
+    """
+
+    @abc.abstractmethod
+    def wait(self, timeout: float) -> bool:
+        """
+        Sleep up to timeout seconds. Return True if woken up by a change
+        """
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class PollingWatcher(Watcher):
+    def wait(self, timeout: float) -> bool:
+        time.sleep(timeout)
+        return False
+
+
+class InotifyWatcher(Watcher):
+    def __init__(self, dir: Union[str, os.PathLike], *, modified: bool = False):
+        libc = _get_libc()
+        mask = _IN_MASK | _IN_MODIFY if modified else _IN_MASK
+        self._fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        if libc.inotify_add_watch(self._fd, os.fsencode(dir), mask) < 0:
+            errno = ctypes.get_errno()
+            os.close(self._fd)
+            raise OSError(errno, f"inotify_add_watch failed for {dir}")
+        self._poll = select.poll()
+        self._poll.register(self._fd, select.POLLIN)
+
+    def wait(self, timeout: float) -> bool:
+        # poll instead of select, which does not support descriptors >= FD_SETSIZE (1024)
+        if not self._poll.poll(max(0, math.ceil(timeout * 1000))):
+            return False
+        # Events are not parsed, the waiter re-checks its predicate anyway
+        try:
+            while os.read(self._fd, 64 * 1024):
+                pass
+        except BlockingIOError:
+            pass
+        return True
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+def _get_libc():
+    global _libc
+    if _libc is None:
+        libc = ctypes.CDLL(None, use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [
+            ctypes.c_int,
+            ctypes.c_char_p,
+            ctypes.c_uint32,
+        ]
+        _libc = libc
+    return _libc
+
+
+def watch(
+    dir: Union[str, os.PathLike], *, backend: Opt[str] = None, modified: bool = False
+) -> Watcher:
+    """
+    Watcher of the directory changes, polling if the directory does not exist or notifications are not available
+
+    :param backend: "auto", "inotify" or "polling", [project-configuration.fswatch] backend by default
+    :param modified: Wake up on every write too, e.g. to follow a growing log
+    """
+    backend = backend or read_toml("project-configuration.fswatch", "backend")
+    if backend == POLLING:
+        return PollingWatcher()
+    if backend == AUTO and not sys.platform.startswith("linux"):
+        return PollingWatcher()
+    if not os.path.isdir(dir):
+        return PollingWatcher()
+    try:
+        return InotifyWatcher(dir, modified=modified)
+    except (OSError, AttributeError) as e:  # No inotify in libc or out of watches
+        if backend == INOTIFY:
+            raise
+        log.debug(f"Polling {dir}, inotify is not available: {e}")
+        return PollingWatcher()
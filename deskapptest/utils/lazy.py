@@ -0,0 +1,66 @@
+import importlib
+import threading
+from types import ModuleType
+from typing import Callable, Optional as Opt
+
+
+class LazyModule:
+    """
+    Module proxy which imports the real module on the first attribute access
+
+    Usage:
+    - Declare the module with an optional hook to configure it once right after the import
+    pyautogui = LazyModule("pyautogui", on_load=lambda m: setattr(m, "FAILSAFE", False))
+    - Use as a regular module
+    pyautogui.click()
+
+    The hook receives the real module and must not use the proxy itself.
+    """
+
+    __slots__ = ("_name", "_on_load", "_module", "_lock")
+
+    def __init__(self, name: str, *, on_load: Opt[Callable[[ModuleType], None]] = None):
+        object.__setattr__(self, "_name", name)
+        object.__setattr__(self, "_on_load", on_load)
+        object.__setattr__(self, "_module", None)
+        object.__setattr__(self, "_lock", threading.Lock())
+
+    @property
+    def loaded(self) -> bool:
+        return self._module is not None
+
+    def load(self) -> ModuleType:
+        """
+        Import the module and run the hook once
+        """
+        module = self._module
+        if module is None:
+            with self._lock:
+                module = self._module
+                if module is None:
+                    module = importlib.import_module(self._name)
+                    if self._on_load:
+                        self._on_load(module)
+                    object.__setattr__(self, "_module", module)
+        return module
+
+    def reconfigure(self) -> ModuleType:
+        """
+        Run the hook again for the already imported module, e.g. after the configuration is changed
+        """
+        if not self.loaded:
+            return self.load()
+        with self._lock:
+            if self._on_load:
+                self._on_load(self._module)
+        return self._module
+
+    def __getattr__(self, attr: str):
+        return getattr(self.load(), attr)
+
+    def __setattr__(self, attr: str, value):
+        setattr(self.load(), attr, value)
+
+    def __repr__(self):
+        state = "loaded" if self.loaded else "not loaded"
+        return f"<LazyModule {self._name!r} ({state})>"
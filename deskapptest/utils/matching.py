@@ -0,0 +1,222 @@
+from __future__ import annotations
+
+import logging as log
+from typing import TYPE_CHECKING, List, Optional as Opt, Tuple
+
+from deskapptest.utils import dirty, frames, metrics, tplcache
+from deskapptest.utils.backends import settings as _settings
+from deskapptest.utils.lazy import LazyModule
+
+if TYPE_CHECKING:
+    import numpy
+    from airtest.core.api import Template
+
+_cv = LazyModule("airtest.core.cv")
+_error = LazyModule("airtest.core.error")
+_transform = LazyModule("airtest.utils.transform")
+_pyramid = LazyModule("deskapptest.utils.pyramid")
+
+PYRAMID_STRATEGY = "pyramid"
+# Pyramid levels prepared for the templates, see pyramid.MAX_LEVELS
+_PYRAMID_LEVELS = 3
+
+# Strategies which scale the original template by themselves
+_MULTISCALE_STRATEGIES = ("mstpl", "gmstpl")
+# Strategies valid on the changed areas only, the keypoint and multiscale ones need the whole screen
+_CROPPABLE_STRATEGIES = ("tpl", PYRAMID_STRATEGY)
+
+
+def _resolution(screen: numpy.ndarray) -> Tuple[int, int]:
+    h, w = screen.shape[:2]
+    return w, h
+
+
+def _prepare(
+    template: Template,
+    screen: numpy.ndarray,
+    resolution: Opt[Tuple[int, int]],
+    strategies: List[str],
+) -> tplcache.PreparedTemplate:
+    if PYRAMID_STRATEGY in strategies:
+        return tplcache.get_cache().get(
+            template,
+            resolution or _resolution(screen),
+            strategy=PYRAMID_STRATEGY,
+            levels=_PYRAMID_LEVELS,
+        )
+    return tplcache.get_cache().get(template, resolution or _resolution(screen))
+
+
+def cv_match(
+    template: Template,
+    screen: numpy.ndarray,
+    *,
+    resolution: Opt[Tuple[int, int]] = None,
+) -> Opt[dict]:
+    """
+    Best match of the template in the screen using Settings.CVSTRATEGY, like airtest Template._cv_match.
+
+    :param resolution: Full desktop (width, height) to scale the template recorded with a resolution,
+        the screen size is used by default. Set it when the screen is a region of the desktop.
+
+    Template images are read and scaled once, see :mod:`deskapptest.utils.tplcache`
+    """
+    strategies = _settings.Settings.CVSTRATEGY
+    prepared = _prepare(template, screen, resolution, strategies)
+    ori_image, image = prepared.original, prepared.image
+    for method in strategies:
+        if method == PYRAMID_STRATEGY:
+            ret = template._try_match(
+                _pyramid.PyramidTemplateMatching,
+                image,
+                screen,
+                threshold=template.threshold,
+                rgb=template.rgb,
+                search_pyramid=prepared.pyramid,
+            )
+            if ret:
+                return ret
+            continue
+        func = _cv.MATCHING_METHODS.get(method)
+        if func is None:
+            raise _error.InvalidMatchingMethodError(
+                f"Undefined method in CVSTRATEGY: '{method}', "
+                f"use one of {[*_cv.MATCHING_METHODS, PYRAMID_STRATEGY]} instead."
+            )
+        if method in _MULTISCALE_STRATEGIES:
+            ret = template._try_match(
+                func,
+                ori_image,
+                screen,
+                threshold=template.threshold,
+                rgb=template.rgb,
+                record_pos=template.record_pos,
+                resolution=template.resolution,
+                scale_max=template.scale_max,
+                scale_step=template.scale_step,
+            )
+        else:
+            ret = template._try_match(
+                func, image, screen, threshold=template.threshold, rgb=template.rgb
+            )
+        if ret:
+            return ret
+    return None
+
+
+def _changed_regions(
+    template: Template,
+    screen: numpy.ndarray,
+    resolution: Tuple[int, int],
+    tracker: Opt[dirty.DirtyTiles],
+) -> Opt[List[frames.Rect]]:
+    """
+    Screen areas to match, None - the whole screen. An unchanged screen is skipped with any strategy,
+    a changed one is cropped only for :data:`_CROPPABLE_STRATEGIES`
+    """
+    if tracker is None:
+        return None
+    strategies = _settings.Settings.CVSTRATEGY
+    image = _prepare(template, screen, resolution, strategies).image
+    h, w = image.shape[:2]
+    regions = tracker.regions(w, h)
+    if regions is None:
+        return None
+    if regions and not all(s in _CROPPABLE_STRATEGIES for s in strategies):
+        return None
+    # Template can not be found in the area smaller than the template itself
+    return [r for r in regions if r.width >= w and r.height >= h]
+
+
+@metrics.timed("matching.match_in")
+def match_in(
+    template: Template,
+    screen: numpy.ndarray,
+    *,
+    resolution: Opt[Tuple[int, int]] = None,
+    tracker: Opt[dirty.DirtyTiles] = None,
+) -> Opt[Tuple[int, int]]:
+    """
+    Target position of the template in the screen, like airtest Template.match_in
+
+    :param tracker: Match only the areas changed since the previous frame, the tracker must be updated
+        with the screen already. Use in the retry loops when the template was not found in the previous frame
+    """
+    resolution = resolution or _resolution(screen)
+    regions = _changed_regions(template, screen, resolution, tracker)
+    if regions is None:
+        ret = cv_match(template, screen, resolution=resolution)
+    else:
+        ret = None
+        for region in regions:
+            region_ret = cv_match(
+                template, frames.crop(screen, region), resolution=resolution
+            )
+            if region_ret and (not ret or region_ret["confidence"] > ret["confidence"]):
+                ret = offset_match(region_ret, region.left, region.top)
+    log.debug(f"Match result={ret}")
+    if not ret:
+        return None
+    return _transform.TargetPos().getXY(ret, template.target_pos)
+
+
+def _match_all_in(
+    template: Template, screen: numpy.ndarray, resolution: Tuple[int, int]
+) -> List[dict]:
+    strategies = _settings.Settings.CVSTRATEGY
+    prepared = _prepare(template, screen, resolution, strategies)
+    if PYRAMID_STRATEGY in strategies:
+        matcher = _pyramid.PyramidTemplateMatching(
+            prepared.image,
+            screen,
+            threshold=template.threshold,
+            rgb=template.rgb,
+            search_pyramid=prepared.pyramid,
+        )
+    else:
+        matcher = _cv.TemplateMatching(
+            prepared.image, screen, threshold=template.threshold, rgb=template.rgb
+        )
+    return matcher.find_all_results() or []
+
+
+@metrics.timed("matching.match_all_in")
+def match_all_in(
+    template: Template,
+    screen: numpy.ndarray,
+    *,
+    resolution: Opt[Tuple[int, int]] = None,
+    tracker: Opt[dirty.DirtyTiles] = None,
+) -> List[dict]:
+    """
+    All matches of the template in the screen, like airtest Template.match_all_in.
+    Uses the pyramid matching if it is in Settings.CVSTRATEGY, the full template matching otherwise
+
+    :param tracker: See :func:`match_in`
+    """
+    resolution = resolution or _resolution(screen)
+    regions = _changed_regions(template, screen, resolution, tracker)
+    if regions is None:
+        return _match_all_in(template, screen, resolution)
+    matches = {}
+    for region in regions:
+        for match in _match_all_in(template, frames.crop(screen, region), resolution):
+            match = offset_match(match, region.left, region.top)
+            # Areas can overlap
+            matches.setdefault(match["result"], match)
+    return sorted(matches.values(), key=lambda m: m["confidence"], reverse=True)
+
+
+def offset_pos(pos: Tuple[int, int], left: int, top: int) -> Tuple[int, int]:
+    return pos[0] + left, pos[1] + top
+
+
+def offset_match(match: dict, left: int, top: int) -> dict:
+    """
+    Translate match result found in a region into the screen coordinates
+    """
+    return {
+        **match,
+        "result": offset_pos(match["result"], left, top),
+        "rectangle": tuple(offset_pos(p, left, top) for p in match["rectangle"]),
+    }
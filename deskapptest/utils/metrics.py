@@ -0,0 +1,231 @@
+"""
+Timings of the hot paths (frame grabs, template decode and matching, waits, window lookups) for a test session
+
+Disabled by default, a disabled span costs a flag check. Enable with `enabled = true` in
+[project-configuration.metrics] or :func:`enable`, export at the end of the session:
+
+metrics.enable()
+...
+metrics.export_json("metrics.json")
+metrics.export_chrome_trace("trace.json")  # Open in chrome://tracing or https://ui.perfetto.dev
+"""
+
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, NamedTuple, Optional as Opt, Union
+
+from deskapptest.utils import conf
+
+# Trace events kept for the Chrome trace, the oldest ones are dropped. Histograms count all the spans
+MAX_EVENTS = 100_000
+
+# Read from the configuration on the first span, not on import
+_enabled: Opt[bool] = None
+_lock = threading.Lock()
+
+
+class Event(NamedTuple):
+    name: str
+    start_ns: int
+    duration_ns: int
+    thread_id: int
+
+
+class Histogram:
+    """
+    Span durations of one operation in power-of-two microsecond buckets
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total_ns = 0
+        self.min_ns: Opt[int] = None
+        self.max_ns = 0
+        # Bucket upper bound in µs -> count
+        self.buckets: Dict[int, int] = {}
+
+    def add(self, duration_ns: int):
+        self.count += 1
+        self.total_ns += duration_ns
+        self.min_ns = (
+            duration_ns if self.min_ns is None else min(self.min_ns, duration_ns)
+        )
+        self.max_ns = max(self.max_ns, duration_ns)
+        bucket = 1 << max(0, (duration_ns // 1000)).bit_length()
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+
+    def percentile_ms(self, q: float) -> float:
+        """
+        Upper bound of the bucket holding the q (0..1) quantile, the max for the last bucket
+        """
+        rank = q * self.count
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                return min(bucket * 1000, self.max_ns) / 1e6
+        return self.max_ns / 1e6
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "total_ms": self.total_ns / 1e6,
+            "mean_ms": self.total_ns / self.count / 1e6 if self.count else 0.0,
+            "min_ms": (self.min_ns or 0) / 1e6,
+            "max_ms": self.max_ns / 1e6,
+            "p50_ms": self.percentile_ms(0.5),
+            "p95_ms": self.percentile_ms(0.95),
+            "p99_ms": self.percentile_ms(0.99),
+            "buckets_us": {str(k): v for k, v in sorted(self.buckets.items())},
+        }
+
+
+_histograms: Dict[str, Histogram] = {}
+_events: Deque[Event] = deque(maxlen=MAX_EVENTS)
+
+
+def record(name: str, start_ns: int, duration_ns: int):
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = Histogram()
+        histogram.add(duration_ns)
+        _events.append(Event(name, start_ns, duration_ns, threading.get_ident()))
+
+
+class _Span:
+    __slots__ = ("name", "start_ns")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter_ns()
+        record(self.name, self.start_ns, end - self.start_ns)
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+def _read_enabled() -> bool:
+    global _enabled
+    _enabled = bool(
+        conf.read_toml("project-configuration.metrics", "enabled", default=False)
+    )
+    return _enabled
+
+
+def span(name: str):
+    """
+    Context manager timing its block as the operation
+
+    Usage:
+    with metrics.span("frames.grab"):
+        frame = source.grab()
+    """
+    if _enabled or (_enabled is None and _read_enabled()):
+        return _Span(name)
+    return _NOOP
+
+
+def timed(name: str) -> Callable[[Callable], Callable]:
+    """
+    Decorator timing the function calls as the operation
+    """
+
+    def decorator(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not (_enabled or (_enabled is None and _read_enabled())):
+                return fn(*args, **kwargs)
+            start = time.perf_counter_ns()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                record(name, start, time.perf_counter_ns() - start)
+
+        return wrapper
+
+    return decorator
+
+
+def enable(on: bool = True):
+    global _enabled
+    _enabled = on
+
+
+def is_enabled() -> bool:
+    return _read_enabled() if _enabled is None else _enabled
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+        _events.clear()
+
+
+def histograms() -> Dict[str, Dict[str, Any]]:
+    """
+    Operation name -> its histogram summary
+    """
+    with _lock:
+        return {name: h.to_dict() for name, h in sorted(_histograms.items())}
+
+
+def _dump(data: Dict[str, Any], path: Opt[Union[str, os.PathLike]]):
+    if path is not None:
+        with open(path, "w") as f:
+            json.dump(data, f, indent=1)
+
+
+def export_json(path: Opt[Union[str, os.PathLike]] = None) -> Dict[str, Any]:
+    """
+    Histograms of all the operations, written to the path if set
+    """
+    data = {"operations": histograms()}
+    _dump(data, path)
+    return data
+
+
+def export_chrome_trace(path: Opt[Union[str, os.PathLike]] = None) -> Dict[str, Any]:
+    """
+    Recorded spans in the Chrome trace event format, written to the path if set
+    """
+    with _lock:
+        events: List[Event] = list(_events)
+    pid = os.getpid()
+    data = {
+        "traceEvents": [
+            {
+                "name": e.name,
+                "cat": e.name.split(".")[0],
+                "ph": "X",
+                "ts": e.start_ns / 1000,
+                "dur": e.duration_ns / 1000,
+                "pid": pid,
+                "tid": e.thread_id,
+            }
+            for e in events
+        ],
+        "displayTimeUnit": "ms",
+    }
+    _dump(data, path)
+    return data
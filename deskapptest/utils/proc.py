@@ -1,62 +1,200 @@
 import psutil
 import os
-from typing import List
+import sys
+import time
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional as Opt
+
+from deskapptest.utils import metrics, wait
+
+ProcsT = List[psutil.Process]
+# Interval of the exit checks if the OS denies waiting for a process
+_EXIT_RETRY_MS = 50
+
+
+class ExitReport(NamedTuple):
+    gone: ProcsT
+    alive: ProcsT
+    # pid -> ms between the kill and the confirmed exit of the gone processes
+    exit_ms: Dict[int, float]
 
 
 def _fmt_proc(name: str):
-    if not name.endswith(".exe"):
+    """
+    Executable name as listed by the OS, ".exe" is appended on Windows only
+    """
+    if sys.platform == "win32" and not name.endswith(".exe"):
         name = name + ".exe"
     return name
 
 
+class ProcSnapshot:
+    """
+    Processes indexed by name and parent pid, gathered with a single pass over the process table
+
+    Usage:
+    snap = ProcSnapshot.take()
+    snap.by_name("app", "helper")
+    snap.tree(pid)
+    """
+
+    ATTRS = ["name", "pid", "ppid", "create_time"]
+
+    def __init__(self, procs: Iterable[psutil.Process]):
+        """
+        :param procs: Processes with :attr:`ATTRS` gathered into `info`, see :func:`psutil.process_iter`
+        """
+        self.procs: Dict[int, psutil.Process] = {}
+        self._by_name: Dict[str, ProcsT] = defaultdict(list)
+        self._children: Dict[int, List[int]] = defaultdict(list)
+        for p in procs:
+            self.procs[p.pid] = p
+            self._by_name[p.info["name"]].append(p)
+            if p.info["ppid"] is not None:
+                self._children[p.info["ppid"]].append(p.pid)
+
+    @classmethod
+    def take(cls) -> "ProcSnapshot":
+        return cls(psutil.process_iter(cls.ATTRS))
+
+    def by_name(self, *processes: str) -> ProcsT:
+        """
+        Processes with any of the names, ".exe" is appended if missing on Windows
+        """
+        return [p for name in processes for p in self._by_name.get(_fmt_proc(name), [])]
+
+    def children(self, pid: int) -> ProcsT:
+        """
+        All descendants of the process. A child created before its parent is skipped,
+        its ppid belongs to an exited process whose pid was reused
+        """
+        descendants = []
+        stack = [pid]
+        while stack:
+            parent = self.procs.get(stack.pop())
+            for child_pid in self._children.get(parent.pid if parent else -1, []):
+                child = self.procs[child_pid]
+                if parent and (child.info["create_time"] or 0) < (
+                    parent.info["create_time"] or 0
+                ):
+                    continue
+                descendants.append(child)
+                stack.append(child_pid)
+        return descendants
+
+    def tree(self, pid: int, include_parent=True) -> ProcsT:
+        """
+        Descendants of the process followed by the process itself
+        """
+        procs = self.children(pid)
+        if include_parent and pid in self.procs:
+            procs.append(self.procs[pid])
+        return procs
+
+
 def get_proc_ids(process: str) -> List[int]:
     return [p.pid for p in get_procs(process)]
 
 
 def get_procs(process: str) -> List[psutil.Process]:
-    name = _fmt_proc(process)
-    ids = []
-    processes = psutil.process_iter(["name"])
-    for p in processes:
-        if p.name() == name:
-            ids.append(p)
-    return ids
+    return ProcSnapshot.take().by_name(process)
 
 
-def kill_proc(process: str):
-    name = _fmt_proc(process)
-    ls = get_proc_ids(name)
+@metrics.timed("proc.kill_proc")
+def kill_proc(process: str) -> ExitReport:
+    return kill_procs([process])
 
-    if len(ls) != 0:
-        for i in ls:
-            try:
-                kill_proctree(i)
-            except psutil.NoSuchProcess:
-                pass
 
+@metrics.timed("proc.kill_procs")
+def kill_procs(
+    processes: Iterable[str],
+    *,
+    timeout: Opt[float] = None,
+    on_terminate: Opt[Callable[[psutil.Process], None]] = None,
+) -> ExitReport:
+    """
+    Kill the process trees of all the processes with the names using one process table snapshot
+    and wait for all of them at once
 
-def kill_proctree(pid, include_parent=True, timeout=None, on_terminate=None):
-    assert pid != os.getpid()
+    :param timeout: Seconds to wait for the exit, None - until all the processes are gone
+    """
+    snapshot = ProcSnapshot.take()
+    victims: Dict[int, psutil.Process] = {}
+    for p in snapshot.by_name(*processes):
+        for member in snapshot.tree(p.pid):
+            if member.pid != os.getpid():
+                victims.setdefault(member.pid, member)
+    return _kill_and_wait(list(victims.values()), timeout, on_terminate)
+
+
+def _is_gone(p: psutil.Process) -> bool:
     try:
-        parent = psutil.Process(pid)
+        return not p.is_running() or p.status() == psutil.STATUS_ZOMBIE
     except psutil.NoSuchProcess:
-        return
+        return True
+    except psutil.AccessDenied:
+        return not psutil.pid_exists(p.pid)
 
-    children = parent.children(recursive=True)
-    if include_parent:
-        children.append(parent)
-    for p in children:
+
+def _poll_gone(
+    procs: ProcsT, timeout: Opt[float], on_gone: Callable[[psutil.Process], None]
+) -> ProcsT:
+    """
+    Wait for the exit checking each process, if the OS denies waiting for some of them.
+    Return the alive processes
+    """
+    alive = list(procs)
+
+    def all_gone():
+        for p in list(alive):
+            if _is_gone(p):
+                alive.remove(p)
+                on_gone(p)
+        return not alive
+
+    wait_ms = wait.TimeoutMs.long if timeout is None else int(timeout * 1000)
+    wait.pollwait(all_gone, wait_ms=wait_ms, retry_ms=_EXIT_RETRY_MS)
+    return alive
+
+
+def _kill_and_wait(
+    procs: ProcsT,
+    timeout: Opt[float],
+    on_terminate: Opt[Callable[[psutil.Process], None]],
+) -> ExitReport:
+    killed = time.monotonic()
+    for p in procs:
         try:
             p.kill()
         except psutil.NoSuchProcess:
             pass
+
+    exited: Dict[int, float] = {}
+
+    def on_gone(p: psutil.Process):
+        exited[p.pid] = (time.monotonic() - killed) * 1000
+        if on_terminate:
+            on_terminate(p)
+
     try:
-        gone, alive = psutil.wait_procs(
-            children, timeout=timeout, callback=on_terminate
-        )
+        gone, alive = psutil.wait_procs(procs, timeout=timeout, callback=on_gone)
     except (
         psutil.AccessDenied
-    ):  # On some envs processes are deleted but this error is raised
-        gone, alive = children, list(psutil.process_iter())
+    ):  # On some envs waiting is denied for the exiting processes
+        alive = _poll_gone([p for p in procs if p.pid not in exited], timeout, on_gone)
+        gone = [p for p in procs if p.pid in exited]
+    return ExitReport(gone, alive, exited)
+
 
-    return (gone, alive)
+def kill_proctree(pid, include_parent=True, timeout=None, on_terminate=None):
+    assert pid != os.getpid()
+    try:
+        parent = psutil.Process(pid)
+    except psutil.NoSuchProcess:
+        return
+
+    children = parent.children(recursive=True)
+    if include_parent:
+        children.append(parent)
+    report = _kill_and_wait(children, timeout, on_terminate)
+    return (report.gone, report.alive)
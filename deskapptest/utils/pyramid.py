@@ -0,0 +1,178 @@
+"""
+Coarse-to-fine template matching, selected with cvstrategy = ["pyramid"] in [airtest-configuration]
+
+The template is matched against the downscaled screen first, then the best coarse candidates are refined
+at the full resolution within small windows around them.
+Imports cv2 and airtest, so it is loaded lazily on the first use of the strategy.
+"""
+
+from typing import List, Optional as Opt, Sequence, Tuple
+
+import cv2
+import numpy as np
+from airtest.aircv.template_matching import TemplateMatching
+from airtest.aircv.utils import (
+    check_source_larger_than_search,
+    generate_result,
+    img_mat_rgb_2_gray,
+)
+from airtest.core.cv import MATCHING_METHODS
+
+from deskapptest.utils.tplcache import build_pyramid
+
+STRATEGY = "pyramid"
+# Max number of the template halvings
+MAX_LEVELS = 3
+# Min template side at the coarse level, smaller templates lose too many details
+MIN_COARSE_SIDE = 12
+
+
+def pyramid_levels(search_shape: Tuple[int, ...]) -> int:
+    h, w = search_shape[:2]
+    levels = 0
+    while levels < MAX_LEVELS and min(h, w) >> (levels + 1) >= MIN_COARSE_SIDE:
+        levels += 1
+    return levels
+
+
+def downscale(gray: np.ndarray, levels: int) -> np.ndarray:
+    """
+    Downscale the image twice per level (averaging the pixels)
+    """
+    if not levels:
+        return gray
+    h, w = gray.shape[:2]
+    scale = 1 << levels
+    return cv2.resize(
+        gray, (max(1, w // scale), max(1, h // scale)), interpolation=cv2.INTER_AREA
+    )
+
+
+class PyramidTemplateMatching(TemplateMatching):
+    METHOD_NAME = "Pyramid"
+    # Number of the coarse candidates refined at the full resolution for the best result
+    CANDIDATES = 5
+
+    def __init__(
+        self,
+        im_search,
+        im_source,
+        threshold=0.8,
+        rgb=True,
+        *,
+        search_pyramid: Opt[Sequence[Sequence[np.ndarray]]] = None,
+    ):
+        """
+        :param search_pyramid: Prepared gray template pyramid, see :func:`~deskapptest.utils.tplcache.build_pyramid`
+        """
+        super().__init__(im_search, im_source, threshold=threshold, rgb=rgb)
+        self.levels = pyramid_levels(im_search.shape)
+        self._search_pyramid = search_pyramid
+        self._src_gray: Opt[np.ndarray] = None
+
+    def _coarse_search(self) -> Sequence[np.ndarray]:
+        pyramid = self._search_pyramid
+        if not pyramid or len(pyramid) <= self.levels:
+            pyramid = build_pyramid(img_mat_rgb_2_gray(self.im_search), self.levels)
+        return pyramid[self.levels]
+
+    def _candidates(self, count: int) -> List[Tuple[int, int]]:
+        """
+        Top-left corners (in the full resolution) of the best coarse matches
+        """
+        src_gray = img_mat_rgb_2_gray(self.im_source)
+        self._src_gray = src_gray
+        coarse_source = downscale(src_gray, self.levels)
+        res = None
+        for coarse_search in self._coarse_search():
+            variant_res = cv2.matchTemplate(
+                coarse_source, coarse_search, cv2.TM_CCOEFF_NORMED
+            )
+            res = variant_res if res is None else np.maximum(res, variant_res, out=res)
+        h, w = coarse_search.shape[:2]
+        scale = 1 << self.levels
+        candidates = []
+        for _ in range(count):
+            _, max_val, _, max_loc = cv2.minMaxLoc(res)
+            if max_val <= -1:
+                break
+            candidates.append((max_loc[0] * scale, max_loc[1] * scale))
+            # Suppress the neighbourhood of the candidate
+            cv2.rectangle(
+                res,
+                (max_loc[0] - w // 2, max_loc[1] - h // 2),
+                (max_loc[0] + w // 2, max_loc[1] + h // 2),
+                -1,
+                -1,
+            )
+        return candidates
+
+    def _refine(self, loc: Tuple[int, int]) -> Tuple[Tuple[int, int], float]:
+        """
+        Best full resolution match in the window around the coarse candidate
+        """
+        src_h, src_w = self._src_gray.shape[:2]
+        h, w = self.im_search.shape[:2]
+        pad = 2 << self.levels
+        x0, y0 = max(0, loc[0] - pad), max(0, loc[1] - pad)
+        x1, y1 = min(src_w, loc[0] + w + pad), min(src_h, loc[1] + h + pad)
+        res = cv2.matchTemplate(
+            self._src_gray[y0:y1, x0:x1],
+            img_mat_rgb_2_gray(self.im_search),
+            cv2.TM_CCOEFF_NORMED,
+        )
+        _, max_val, _, max_loc = cv2.minMaxLoc(res)
+        return (x0 + max_loc[0], y0 + max_loc[1]), max_val
+
+    def _results(self, count: int) -> List[dict]:
+        h, w = self.im_search.shape[:2]
+        results = []
+        seen = set()
+        for candidate in self._candidates(count):
+            loc, max_val = self._refine(candidate)
+            if loc in seen:
+                continue
+            seen.add(loc)
+            confidence = self._get_confidence_from_matrix(loc, max_val, w, h)
+            middle_point, rectangle = self._get_target_rectangle(loc, w, h)
+            results.append(generate_result(middle_point, rectangle, confidence))
+        return sorted(results, key=lambda r: r["confidence"], reverse=True)
+
+    def find_best_result(self):
+        check_source_larger_than_search(self.im_source, self.im_search)
+        if not self.levels:
+            return super().find_best_result()
+        results = self._results(self.CANDIDATES)
+        best_match = results[0] if results else None
+        if best_match and best_match["confidence"] >= self.threshold:
+            return best_match
+        return None
+
+    def find_all_results(self):
+        check_source_larger_than_search(self.im_source, self.im_search)
+        if not self.levels:
+            return super().find_all_results()
+        h, w = self.im_search.shape[:2]
+        result = []
+        for match in self._results(self.MAX_RESULT_COUNT * 2):
+            if match["confidence"] < self.threshold:
+                break
+            x, y = match["result"]
+            # Skip the match overlapping with the better one like the base class does
+            if any(
+                abs(x - r["result"][0]) < w / 2 and abs(y - r["result"][1]) < h / 2
+                for r in result
+            ):
+                continue
+            result.append(match)
+            if len(result) > self.MAX_RESULT_COUNT:
+                break
+        return result if result else None
+
+
+def register():
+    """
+    Make the strategy available for the airtest own matching (loop_find, Template.match_in).
+    Called when the airtest configuration is applied, see :mod:`deskapptest.utils.backends`
+    """
+    MATCHING_METHODS.setdefault(STRATEGY, PyramidTemplateMatching)
@@ -0,0 +1,221 @@
+"""
+Text entry strategies: typing key by key or pasting through the clipboard, see [project-configuration.text-entry]
+
+Typing is paced by the tools (pywinauto after_sendkeys_key_wait per key), so long texts are pasted.
+"""
+
+import time
+import logging as log
+from typing import Callable, Dict, Optional as Opt
+
+from deskapptest.utils import conf
+from deskapptest.utils.lazy import LazyModule
+from deskapptest.utils.wait import WaitPolicy, wait_until
+
+ctypes = LazyModule("ctypes")
+pywintypes = LazyModule("pywintypes")
+win32clipboard = LazyModule("win32clipboard")
+
+AUTO = "auto"
+TYPE = "type"
+PASTE = "paste"
+
+# Interval of the pasted text read-back checks
+_READ_BACK_RETRY_MS = 20
+# Another process may hold the clipboard open for a moment
+_OPEN_WAIT_MS = 1000
+_OPEN_RETRY_MS = 10
+# pywinauto type_keys syntax, new lines and tabs: typed as keys rather than as is.
+# "auto" types such texts to keep them working as with typing only
+KEY_SYNTAX = frozenset("{}+^%~()\n\t")
+# GDI handle formats can not be copied as memory, Windows synthesizes CF_BITMAP etc. from CF_DIB anyway
+_GDI_FORMATS = frozenset({2, 3, 9, 14, 0x80, 0x82, 0x83, 0x8E})
+# The pasted text (e.g. a password) is not kept by the clipboard history and the clipboard monitors
+_PRIVATE_FORMATS = (
+    "ExcludeClipboardContentFromMonitorProcessing",
+    "CanIncludeInClipboardHistory",
+)
+
+_kernel32 = None
+
+
+def choose(text: str, strategy: Opt[str] = None, *, key_syntax: bool = False) -> str:
+    """
+    TYPE or PASTE for the text, "auto" pastes texts of paste_min_chars and longer
+
+    :param strategy: "auto", "type" or "paste", [project-configuration.text-entry] strategy by default
+    :param key_syntax: The text is typed with pywinauto type_keys, "auto" types texts with :data:`KEY_SYNTAX`
+    """
+    strategy = strategy or conf.read_toml(
+        "project-configuration.text-entry", "strategy"
+    )
+    assert strategy in (AUTO, TYPE, PASTE), f"Unknown text entry strategy={strategy}"
+    if strategy != AUTO:
+        return strategy
+    min_chars = conf.read_toml("project-configuration.text-entry", "paste_min_chars")
+    if len(text) < min_chars or key_syntax and not KEY_SYNTAX.isdisjoint(text):
+        return TYPE
+    return PASTE
+
+
+def _normalized(text: Opt[str]) -> Opt[str]:
+    if text is None:
+        return None
+    return text.replace("\r\n", "\n").replace("\r", "\n")
+
+
+def _get_kernel32():
+    global _kernel32
+    if _kernel32 is None:
+        kernel32 = ctypes.WinDLL("kernel32")
+        kernel32.GlobalLock.argtypes = [ctypes.c_void_p]
+        kernel32.GlobalLock.restype = ctypes.c_void_p
+        kernel32.GlobalUnlock.argtypes = [ctypes.c_void_p]
+        kernel32.GlobalSize.argtypes = [ctypes.c_void_p]
+        kernel32.GlobalSize.restype = ctypes.c_size_t
+        _kernel32 = kernel32
+    return _kernel32
+
+
+def _open_clipboard():
+    def opened():
+        try:
+            win32clipboard.OpenClipboard()
+            return True
+        except pywintypes.error:
+            return False
+
+    assert wait_until(
+        opened, wait_ms=_OPEN_WAIT_MS, policy=WaitPolicy(_OPEN_RETRY_MS)
+    ), "Clipboard is held open by another process"
+
+
+def _format_data(fmt: int) -> Opt[bytes]:
+    kernel32 = _get_kernel32()
+    handle = win32clipboard.GetClipboardDataHandle(fmt)
+    ptr = kernel32.GlobalLock(handle)
+    if not ptr:
+        return None
+    try:
+        return ctypes.string_at(ptr, kernel32.GlobalSize(handle))
+    finally:
+        kernel32.GlobalUnlock(handle)
+
+
+def save_clipboard() -> Dict[int, bytes]:
+    """
+    Clipboard contents in all the memory formats (text, images, files, rich text) to restore later
+    """
+    _open_clipboard()
+    try:
+        saved = {}
+        fmt = win32clipboard.EnumClipboardFormats(0)
+        while fmt:
+            if fmt not in _GDI_FORMATS:
+                try:
+                    data = _format_data(fmt)
+                except pywintypes.error:  # Delayed rendering failed
+                    data = None
+                if data is not None:
+                    saved[fmt] = data
+            fmt = win32clipboard.EnumClipboardFormats(fmt)
+        return saved
+    finally:
+        win32clipboard.CloseClipboard()
+
+
+def restore_clipboard(saved: Dict[int, bytes]):
+    """
+    Replace the clipboard contents with the saved ones, an empty dict clears the clipboard
+    """
+    _open_clipboard()
+    try:
+        win32clipboard.EmptyClipboard()
+        for fmt, data in saved.items():
+            win32clipboard.SetClipboardData(fmt, data)
+    finally:
+        win32clipboard.CloseClipboard()
+
+
+def copy_text(text: str):
+    """
+    Put the text into the clipboard, excluded from the clipboard history
+    """
+    _open_clipboard()
+    try:
+        win32clipboard.EmptyClipboard()
+        win32clipboard.SetClipboardText(text, win32clipboard.CF_UNICODETEXT)
+        for name in _PRIVATE_FORMATS:
+            fmt = win32clipboard.RegisterClipboardFormat(name)
+            win32clipboard.SetClipboardData(fmt, b"\0\0\0\0")  # DWORD 0
+    finally:
+        win32clipboard.CloseClipboard()
+
+
+def paste(
+    text: str,
+    send_paste: Callable[[], None],
+    *,
+    read_back: Opt[Callable[[], Opt[str]]] = None,
+):
+    """
+    Put the text into the clipboard, send the paste keys and restore the previous clipboard contents
+    in all its formats (or clear it if it was empty), also if the paste fails.
+    The clipboard is restored once read_back() contains the text or after settle_ms without read_back.
+    An error is raised if the read-back text does not contain the pasted one
+
+    :param read_back: Current text of the input, None if it is not exposed - the paste is not verified then
+    """
+    settle_ms = conf.read_toml("project-configuration.text-entry", "settle_ms")
+    saved = save_clipboard()
+    try:
+        copy_text(text)
+        send_paste()
+        if read_back is None:
+            time.sleep(settle_ms / 1000)
+            return
+        expected = _normalized(text)
+        values = []
+
+        def pasted():
+            values.append(_normalized(read_back()))
+            return values[-1] is None or expected in values[-1]
+
+        verified = wait_until(
+            pasted, wait_ms=settle_ms, policy=WaitPolicy(_READ_BACK_RETRY_MS)
+        )
+        if values[-1] is None:
+            log.debug("Pasted text is not verified, the input value is not exposed")
+            return
+        assert (
+            verified
+        ), f"Pasted text is not read back after {settle_ms} ms: {text[:50]!r}"
+    finally:
+        restore_clipboard(saved)
+
+
+def enter_text(
+    text: str,
+    *,
+    type_text: Callable[[str], None],
+    send_paste: Callable[[], None],
+    strategy: Opt[str] = None,
+    read_back: Opt[Callable[[], Opt[str]]] = None,
+    key_syntax: bool = False,
+) -> str:
+    """
+    Type or paste the text into the focused input. Return the used strategy
+
+    Usage:
+    enter_text(text, type_text=pyautogui.typewrite, send_paste=lambda: pyautogui.hotkey("ctrl", "v"))
+
+    :param read_back: Current text of the input to verify the paste, e.g. element_info.rich_text
+    :param key_syntax: type_text interprets :data:`KEY_SYNTAX`, see :func:`choose`
+    """
+    chosen = choose(text, strategy, key_syntax=key_syntax)
+    log.debug(f"Enter {len(text)} chars with strategy={chosen}")
+    if chosen == PASTE:
+        paste(text, send_paste, read_back=read_back)
+    else:
+        type_text(text)
+    return chosen
@@ -0,0 +1,91 @@
+"""
+Action timing profiles: pauses around mouse/keyboard actions, see [project-configuration.timing] in config.toml
+
+With the "check" readiness the pauses end as soon as the UI is ready (focus confirmed, pixels changed),
+the profile times are the upper bounds then.
+"""
+
+import time
+from typing import Callable, NamedTuple, Optional as Opt
+
+from deskapptest.utils import conf
+from deskapptest.utils.lazy import LazyModule
+from deskapptest.utils.wait import WaitPolicy, wait_until
+
+# Imported lazily as it configures pywinauto with the profile
+_backends = LazyModule("deskapptest.utils.backends")
+
+SAFE = "safe"
+FAST = "fast"
+INSTANT = "instant"
+
+# Readiness modes
+SLEEP = "sleep"
+CHECK = "check"
+
+# Interval of the readiness checks
+_CHECK_RETRY_MS = 20
+
+
+class Profile(NamedTuple):
+    name: str
+    # Seconds of the mouse movement
+    move_duration: float
+    # Pause after the mouse is moved
+    hover_wait: float
+    # Pause between focusing an input and typing into it
+    before_type_wait: float
+    # pywinauto pause after click_input
+    after_clickinput_wait: float
+    readiness: str
+
+
+_override: Opt[str] = None
+
+
+def current() -> Profile:
+    """
+    The profile set with :func:`use` or [project-configuration.timing] profile
+    """
+    return get_profile(
+        _override or conf.read_toml("project-configuration.timing", "profile")
+    )
+
+
+def get_profile(name: str) -> Profile:
+    """
+    Profile from [project-configuration.timing.<name>], times missing in the section are 0
+    """
+    section = f"project-configuration.timing.{name}"
+    readiness = conf.read_toml(section, "readiness")
+    assert readiness in (SLEEP, CHECK), f"Unknown readiness={readiness} of {section}"
+    times = {
+        field: conf.read_toml(section, field, default=0)
+        for field in Profile._fields
+        if field not in ("name", "readiness")
+    }
+    return Profile(name=name, readiness=readiness, **times)
+
+
+def use(name: Opt[str]):
+    """
+    Switch the process to the profile, None - back to the configured one
+    """
+    global _override
+    if name is not None:
+        get_profile(name)  # Fail early on a typo
+    _override = name
+    if _backends.timings.loaded:
+        _backends.timings.reconfigure()
+
+
+def pause(seconds: float, ready: Opt[Callable[[], bool]] = None):
+    """
+    Sleep the seconds or, with the "check" readiness, until ready() is True but not longer than the seconds
+    """
+    if seconds <= 0:
+        return
+    if ready is None or current().readiness != CHECK:
+        time.sleep(seconds)
+        return
+    wait_until(ready, wait_ms=int(seconds * 1000), policy=WaitPolicy(_CHECK_RETRY_MS))
@@ -0,0 +1,217 @@
+"""
+Decoded and preprocessed template images shared between template searches
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import types
+import logging as log
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Hashable, NamedTuple, Optional as Opt, Tuple
+
+from deskapptest.utils import conf, metrics
+from deskapptest.utils.backends import settings as _settings
+from deskapptest.utils.lazy import LazyModule
+
+if TYPE_CHECKING:
+    import numpy
+    from airtest.core.api import Template
+
+cv2 = LazyModule("cv2")
+_aircv = LazyModule("airtest.aircv")
+
+# Preprocessing strategy of the templates used by airtest matching methods
+DEFAULT_STRATEGY = "tpl"
+
+
+class PreparedTemplate(NamedTuple):
+    original: numpy.ndarray
+    # Original image scaled to the screen resolution if the template is recorded with resolution
+    image: numpy.ndarray
+    gray: numpy.ndarray
+    # Gray image pyramid, see build_pyramid
+    pyramid: Tuple[Tuple[numpy.ndarray, ...], ...]
+
+    @property
+    def nbytes(self) -> int:
+        levels = [a for level in self.pyramid for a in level]
+        arrays = {id(a): a for a in (self.original, self.image, self.gray, *levels)}
+        return sum(a.nbytes for a in arrays.values())
+
+
+class CacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    evictions: int
+    size: int
+    nbytes: int
+    max_bytes: int
+
+
+def scale_image(
+    template: Template, image: numpy.ndarray, screen_resolution: Tuple[int, int]
+) -> numpy.ndarray:
+    """
+    Same as airtest Template._resize_image but for the given screen resolution instead of the searched frame size
+    """
+    resize_method = _settings.Settings.RESIZE_METHOD
+    if (
+        not template.resolution
+        or tuple(template.resolution) == tuple(screen_resolution)
+        or resize_method is None
+    ):
+        return image
+    if isinstance(resize_method, types.MethodType):
+        resize_method = resize_method.__func__
+    h, w = image.shape[:2]
+    w_re, h_re = resize_method(w, h, template.resolution, screen_resolution)
+    w_re, h_re = max(1, w_re), max(1, h_re)
+    log.debug(
+        f"Resize template={template} ({w}, {h})->({w_re}, {h_re}), "
+        f"resolution: {template.resolution}=>{screen_resolution}"
+    )
+    return cv2.resize(image, (w_re, h_re))
+
+
+def build_pyramid(
+    gray: numpy.ndarray, levels: int
+) -> Tuple[Tuple[numpy.ndarray, ...], ...]:
+    """
+    Downscaled (twice per level) gray images, pyramid[0] is the gray image itself.
+
+    The template can be placed on the screen at any pixel while the screen is downscaled by the fixed blocks,
+    so each level has the variants of the template shifted by a half of the block in x, y before downscaling.
+    All the variants of the level have the same size.
+    """
+    pyramid = [(gray,)]
+    h, w = gray.shape[:2]
+    for level in range(1, levels + 1):
+        scale = 1 << level
+        step = max(1, scale // 2)
+        hc, wc = (h - step) // scale, (w - step) // scale
+        if min(hc, wc) < 1:
+            break
+        pyramid.append(
+            tuple(
+                cv2.resize(
+                    gray[dy : dy + hc * scale, dx : dx + wc * scale],
+                    (wc, hc),
+                    interpolation=cv2.INTER_AREA,
+                )
+                for dy in (0, step)
+                for dx in (0, step)
+            )
+        )
+    return tuple(pyramid)
+
+
+class TemplateCache:
+    """
+    LRU cache of the templates keyed by (file path, mtime, size, resolution, strategy) and bounded by
+    the memory taken by the cached images. Changed template files are re-read as their key is changed.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[Hashable, PreparedTemplate] = OrderedDict()
+        self._nbytes = 0
+        self._lock = threading.Lock()
+        self._hits = self._misses = self._evictions = 0
+
+    def _key(
+        self,
+        template: Template,
+        screen_resolution: Tuple[int, int],
+        strategy: str,
+        levels: int,
+    ) -> Hashable:
+        filepath = template.filepath
+        try:
+            st = os.stat(filepath)
+            signature = (st.st_mtime_ns, st.st_size)
+        except OSError:  # Let airtest raise its error on the image reading
+            signature = None
+        resolution = (
+            (tuple(template.resolution), tuple(screen_resolution))
+            if template.resolution
+            else None
+        )
+        return filepath, signature, resolution, strategy, levels
+
+    def get(
+        self,
+        template: Template,
+        screen_resolution: Tuple[int, int],
+        *,
+        strategy: str = DEFAULT_STRATEGY,
+        levels: int = 0,
+    ) -> PreparedTemplate:
+        """
+        :param screen_resolution: Full desktop (width, height) to scale the template recorded with resolution
+        :param levels: Number of the gray pyramid levels to prepare
+        """
+        key = self._key(template, screen_resolution, strategy, levels)
+        with self._lock:
+            prepared = self._entries.get(key)
+            if prepared is not None:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return prepared
+            self._misses += 1
+
+        with metrics.span("tplcache.decode"):
+            original = _aircv.imread(template.filepath)
+            image = scale_image(template, original, screen_resolution)
+            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+            prepared = PreparedTemplate(
+                original, image, gray, build_pyramid(gray, levels)
+            )
+
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = prepared
+                self._nbytes += prepared.nbytes
+                self._evict()
+        return prepared
+
+    def _evict(self):
+        # The latest entry is kept even if it exceeds the budget on its own
+        while self._nbytes > self.max_bytes and len(self._entries) > 1:
+            _, prepared = self._entries.popitem(last=False)
+            self._nbytes -= prepared.nbytes
+            self._evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._nbytes = 0
+
+    def cache_info(self) -> CacheInfo:
+        return CacheInfo(
+            self._hits,
+            self._misses,
+            self._evictions,
+            len(self._entries),
+            self._nbytes,
+            self.max_bytes,
+        )
+
+
+_cache: Opt[TemplateCache] = None
+
+
+def get_cache() -> TemplateCache:
+    global _cache
+    if _cache is None:
+        max_mb = conf.read_toml("project-configuration.template-cache", "max_mb")
+        _cache = TemplateCache(int(max_mb * 1024 * 1024))
+    return _cache
+
+
+def cache_info() -> CacheInfo:
+    """
+    Hit/miss/eviction counters and the memory taken by the cached templates
+    """
+    return get_cache().cache_info()
@@ -1,14 +1,123 @@
+from __future__ import annotations
+
+import dataclasses
+import random
 import time
-from typing import Callable, Optional as Opt, Tuple
+import logging as log
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Awaitable,
+    Callable,
+    Iterator,
+    List,
+    Optional as Opt,
+    Tuple,
+)
 
+from deskapptest.utils import metrics
 from deskapptest.utils.conf import read_toml
+from deskapptest.utils.lazy import LazyModule
+
+if TYPE_CHECKING:
+    from concurrent.futures import Executor
+
+# Imported on the first async wait, it is a noticeable part of the package import time
+asyncio = LazyModule("asyncio")
+
+
+class _TimeoutMsMeta(type):
+    # Read on access, so importing the module does not parse the configuration
+    @property
+    def instant(cls) -> int:
+        return read_toml("project-configuration.timeout-ms", "instant")
+
+    @property
+    def short(cls) -> int:
+        return read_toml("project-configuration.timeout-ms", "short")
+
+    @property
+    def mid(cls) -> int:
+        return read_toml("project-configuration.timeout-ms", "mid")
+
+    @property
+    def long(cls) -> int:
+        return read_toml("project-configuration.timeout-ms", "long")
+
+
+class TimeoutMs(metaclass=_TimeoutMsMeta):
+    pass
+
+
+FIXED = "fixed"
+EXPONENTIAL = "exponential"
+# Exponential backoff with the randomized intervals, to not poll in lockstep with other waiters
+JITTER = "jitter"
+
+
+@dataclasses.dataclass(frozen=True)
+class WaitPolicy:
+    """
+    Intervals between the predicate checks
+
+    Usage:
+    WaitPolicy(retry_ms=100)  # Fixed
+    WaitPolicy(retry_ms=100, backoff=2, max_retry_ms=2000)  # Exponential with cap
+    WaitPolicy(retry_ms=100, backoff=2, max_retry_ms=2000, jitter=0.2)  # +-20% of every interval
+    """
+
+    retry_ms: int
+    backoff: float = 1.0
+    max_retry_ms: Opt[int] = None
+    jitter: float = 0.0
+
+    @classmethod
+    def named(cls, name: str, retry_ms: int) -> "WaitPolicy":
+        """
+        Policy by its name in [project-configuration.retry-ms] policy
+        """
+        if name == FIXED:
+            return cls(retry_ms)
+        max_retry_ms = read_toml("project-configuration.retry-ms", "max_retry")
+        backoff = read_toml("project-configuration.retry-ms", "backoff")
+        if name == EXPONENTIAL:
+            return cls(retry_ms, backoff, max(retry_ms, max_retry_ms))
+        if name == JITTER:
+            jitter = read_toml("project-configuration.retry-ms", "jitter")
+            return cls(retry_ms, backoff, max(retry_ms, max_retry_ms), jitter)
+        raise ValueError(f"Unknown wait policy={name}")
+
+    def intervals(self) -> Iterator[float]:
+        """
+        Endless sleep intervals in seconds
+        """
+        interval = self.retry_ms
+        while True:
+            jittered = interval
+            if self.jitter:
+                jittered *= random.uniform(1 - self.jitter, 1 + self.jitter)
+            yield max(0, jittered) / 1000
+            interval *= self.backoff
+            if self.max_retry_ms is not None:
+                interval = min(interval, self.max_retry_ms)
+
+
+@dataclasses.dataclass
+class WaitResult:
+    """
+    Last predicate value and the wait statistics. True if the predicate succeeded
+    """
 
+    value: Any
+    attempts: int
+    elapsed_ms: float
+    # Time taken by the predicate calls, the rest is spent sleeping
+    predicate_ms: float
+    # The predicate returned a truthy value, the value itself is not evaluated again (e.g. numpy arrays)
+    success: bool = False
 
-class TimeoutMs:
-    instant = read_toml("project-configuration.timeout-ms", "instant")
-    short = read_toml("project-configuration.timeout-ms", "short")
-    mid = read_toml("project-configuration.timeout-ms", "mid")
-    long = read_toml("project-configuration.timeout-ms", "long")
+    def __bool__(self):
+        return self.success
 
 
 def _init_wait(
@@ -26,20 +135,226 @@ def _init_wait(
     return wait, retry
 
 
+def _init_policy(retry_ms: int, policy: Opt[WaitPolicy] = None) -> WaitPolicy:
+    if policy is not None:
+        return policy
+    return WaitPolicy.named(
+        read_toml("project-configuration.retry-ms", "policy"), retry_ms
+    )
+
+
+def wait_until(
+    predicate_fn: Callable[[], Any],
+    *,
+    wait_ms: int,
+    policy: WaitPolicy,
+    sleep: Callable[[float], Any] = time.sleep,
+    clock: Callable[[], float] = time.monotonic,
+) -> WaitResult:
+    """
+    Call the predicate until it returns a truthy value or the deadline passes. The first call is done right away,
+    the last one - at the deadline. Time taken by the predicate counts towards the deadline.
+
+    :param wait_ms: 0 - call the predicate only once
+    :param sleep: Sleeps between the calls for the given seconds, may return earlier with True, e.g.
+        :meth:`~deskapptest.utils.fswatch.Watcher.wait`. The interval is not advanced after such a wake-up
+    :param clock: Seconds of the deadline, a virtual clock advanced by the sleep replays recorded frames,
+        see :class:`~deskapptest.utils.frames.ReplaySource`
+    """
+    start = clock()
+    deadline = start + wait_ms / 1000
+    attempts = 0
+    predicate_s = 0.0
+    success = False
+    intervals = policy.intervals()
+    interval = next(intervals)
+    while True:
+        called = clock()
+        with metrics.span("wait.predicate"):
+            value = predicate_fn()
+        finished = clock()
+        attempts += 1
+        predicate_s += finished - called
+        if value:
+            success = True
+            break
+        remaining = deadline - finished
+        if remaining <= 0:
+            break
+        with metrics.span("wait.sleep"):
+            woken = sleep(min(interval, remaining))
+        # A change woke the sleep up early, the backoff is kept for the next sleep
+        if woken is not True:
+            interval = next(intervals)
+    return _wait_result(
+        predicate_fn, value, success, attempts, clock() - start, predicate_s
+    )
+
+
+def _wait_result(
+    predicate_fn: Callable,
+    value: Any,
+    success: bool,
+    attempts: int,
+    elapsed_s: float,
+    predicate_s: float,
+) -> WaitResult:
+    result = WaitResult(
+        value, attempts, elapsed_s * 1000, predicate_s * 1000, success=success
+    )
+    log.debug(
+        f"Waited for {predicate_fn}: success={result.success}, attempts={result.attempts}, "
+        f"elapsed_ms={result.elapsed_ms:.0f}, predicate_ms={result.predicate_ms:.0f}"
+    )
+    return result
+
+
 def pollwait(
-    predicate_fn: Callable, *, wait_ms: Opt[int] = None, retry_ms: Opt[int] = None
+    predicate_fn: Callable,
+    *,
+    wait_ms: Opt[int] = None,
+    retry_ms: Opt[int] = None,
+    policy: Opt[WaitPolicy] = None,
+    sleep: Callable[[float], Any] = time.sleep,
 ):
     """
     :param int wait_ms: How long to wait for the predicate to be True. Accept 0 - means checking for a predicate only once without looping
+    :param policy: Intervals between the checks, [project-configuration.retry-ms] policy by default
+    :param sleep: See :func:`wait_until`
+    :return: The predicate result or None if it is not truthy until the timeout
     """
     wait, retry = _init_wait(wait_ms, retry_ms, wait_ms_def=TimeoutMs.long)
-    waited = 0
-    result = predicate_fn()
-    while not result and wait > 0:
-        time.sleep(retry / 1000)
-        result = predicate_fn()
-        waited += retry
-        if waited >= wait:
-            return None
-    else:
-        return result
+    result = wait_until(
+        predicate_fn, wait_ms=wait, policy=_init_policy(retry, policy), sleep=sleep
+    )
+    return result.value if result else None
+
+
+async def async_wait_until(
+    predicate_fn: Callable[[], Any],
+    *,
+    wait_ms: int,
+    policy: WaitPolicy,
+    offload: bool = False,
+    executor: Opt[Executor] = None,
+) -> WaitResult:
+    """
+    :func:`wait_until` sleeping with asyncio, so other waiters run meanwhile
+
+    :param predicate_fn: Function or coroutine function
+    :param offload: Run the (CPU-heavy) function predicate in the executor instead of the event loop thread.
+        Cancelling the wait does not interrupt the predicate already running in the executor
+    :param executor: The loop default executor if not set
+    """
+    loop = asyncio.get_running_loop()
+    start = time.monotonic()
+    deadline = start + wait_ms / 1000
+    attempts = 0
+    predicate_s = 0.0
+    success = False
+    for interval in policy.intervals():
+        called = time.monotonic()
+        if asyncio.iscoroutinefunction(predicate_fn):
+            value = await predicate_fn()
+        elif offload:
+            value = await loop.run_in_executor(executor, predicate_fn)
+        else:
+            value = predicate_fn()
+        finished = time.monotonic()
+        attempts += 1
+        predicate_s += finished - called
+        if value:
+            success = True
+            break
+        remaining = deadline - finished
+        if remaining <= 0:
+            break
+        await asyncio.sleep(min(interval, remaining))
+    return _wait_result(
+        predicate_fn, value, success, attempts, time.monotonic() - start, predicate_s
+    )
+
+
+async def async_pollwait(
+    predicate_fn: Callable,
+    *,
+    wait_ms: Opt[int] = None,
+    retry_ms: Opt[int] = None,
+    policy: Opt[WaitPolicy] = None,
+    offload: bool = False,
+):
+    """
+    Async :func:`pollwait`, see :func:`async_wait_until` for offload
+
+    :return: The predicate result or None if it is not truthy until the timeout
+    """
+    wait, retry = _init_wait(wait_ms, retry_ms, wait_ms_def=TimeoutMs.long)
+    result = await async_wait_until(
+        predicate_fn, wait_ms=wait, policy=_init_policy(retry, policy), offload=offload
+    )
+    return result.value if result else None
+
+
+async def _cancel(tasks):
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def first_of(*aws: Awaitable) -> Tuple[Opt[int], Any]:
+    """
+    Run the waiters concurrently until the first one returns a truthy result, the rest are cancelled right away.
+    A waiter which raises (e.g. TargetNotFoundError on its timeout) counts as failed and the rest keep waiting.
+    The first error is raised only if all the waiters raised
+
+    Usage:
+    index, value = await first_of(
+        async_find_template(dialog), async_pollwait(app_exited), async_pollwait(error_logged)
+    )
+
+    :return: Index of the succeeded waiter and its result, (None, None) if no one succeeded
+    """
+    tasks = [asyncio.ensure_future(aw) for aw in aws]
+    pending = set(tasks)
+    errors: List[BaseException] = []
+    try:
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in tasks:
+                if task not in done:
+                    continue
+                if task.exception() is not None:
+                    log.debug(
+                        f"Waiter {tasks.index(task)} failed: {task.exception()!r}"
+                    )
+                    errors.append(task.exception())
+                elif task.result():
+                    return tasks.index(task), task.result()
+        if errors and len(errors) == len(tasks):
+            raise errors[0]
+        return None, None
+    finally:
+        await _cancel(pending)
+
+
+async def all_of(*aws: Awaitable) -> Opt[List[Any]]:
+    """
+    Run the waiters concurrently until all of them return truthy results. As soon as any waiter fails
+    (returns a falsy result or raises) the rest are cancelled
+
+    :return: Results in the waiters order, None if any waiter returned a falsy result
+    """
+    tasks = [asyncio.ensure_future(aw) for aw in aws]
+    pending = set(tasks)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            if not all(task.result() for task in done):
+                return None
+        return [task.result() for task in tasks]
+    finally:
+        await _cancel(pending)
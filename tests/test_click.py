@@ -0,0 +1,35 @@
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from deskapptest.apps import base
+from deskapptest.utils import frames, timing
+
+
+@pytest.fixture
+def screen(monkeypatch):
+    frame = np.full((100, 100, 3), 200, dtype=np.uint8)
+    prev = frames.set_source(frames.ArraySource(frame))
+    monkeypatch.setattr(base, "pyautogui", SimpleNamespace(moveTo=lambda *a, **k: None))
+    timing.use(timing.FAST)
+    yield frame
+    timing.use(None)
+    frames.set_source(prev)
+
+
+def test_click_reaction_ends_the_pauses(screen):
+    def click():
+        screen[45:55, 45:55] = 0
+
+    start = time.monotonic()
+    base._click_at((50, 50), click)
+    # Hover settles after a check interval, the click reaction is seen on the first check
+    assert time.monotonic() - start < timing.current().hover_wait
+
+
+def test_no_click_reaction_waits_the_bound(screen):
+    start = time.monotonic()
+    base._click_at((50, 50), lambda: None)
+    assert time.monotonic() - start >= timing.current().hover_wait
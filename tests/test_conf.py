@@ -0,0 +1,41 @@
+from deskapptest.utils import conf
+
+
+def _layers(tmp_path, *texts):
+    paths = []
+    for i, text in enumerate(texts):
+        path = tmp_path / f"{i}.toml"
+        path.write_text(text)
+        paths.append(path)
+    return conf.LayeredToml(*paths)
+
+
+def test_zero_and_false_override_lower_layers(tmp_path):
+    toml = _layers(
+        tmp_path,
+        "[s]\nwait = 0.5\nenabled = true\nname = 'lib'\nkept = 1\n",
+        "[s]\nwait = 0\nenabled = false\nname = ''\n",
+    )
+    assert toml.get("s", "wait") == 0
+    assert toml.get("s", "enabled") is False
+    assert toml.get("s", "name") == "lib"  # Empty string is not an override
+    assert toml.get("s", "kept") == 1
+    assert toml.get("s", "missing") is None
+
+
+def test_read_toml_zero_and_default(monkeypatch, tmp_path):
+    monkeypatch.setattr(conf, "_toml", _layers(tmp_path, "[s]\nwait = 0\n"))
+    assert conf.read_toml("s", "wait") == 0
+    assert conf.read_toml("s", "missing", default=3) == 3
+
+
+def test_ini_env_override_for_camel_case_props(monkeypatch, tmp_path):
+    ini = tmp_path / "apps.ini"
+    ini.write_text("[paths]\nslackPath = C:/file\nhome = C:/Users/<user>\n")
+    monkeypatch.setattr(conf, "_login", lambda: "tester")
+    monkeypatch.setenv("paths_slackPath", "C:/env")
+    assert conf.read_ini(ini, "paths", "slackPath") == "C:/env"
+    assert conf.read_ini_section(ini, "paths") == {
+        "slackpath": "C:/env",
+        "home": "C:/Users/tester",
+    }
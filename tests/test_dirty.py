@@ -0,0 +1,72 @@
+import numpy as np
+
+from deskapptest.utils.dirty import DirtyTiles
+
+
+def _frame():
+    return np.full((64, 64, 3), 200, dtype=np.uint8)
+
+
+def test_first_frame_is_matched_whole():
+    tracker = DirtyTiles(16)
+    assert tracker.update(_frame()) is None
+    assert tracker.regions(8, 8) is None
+
+
+def test_unchanged_frame_has_no_regions():
+    tracker = DirtyTiles(16)
+    tracker.update(_frame())
+    assert not tracker.update(_frame()).any()
+    assert tracker.regions(8, 8) == []
+
+
+def test_glyph_moved_within_tile_with_same_mass():
+    before, after = _frame(), _frame()
+    before[20:24, 18:20] = 0
+    after[20:24, 26:28] = 0  # Same tile (16..32), same number of dark pixels
+    tracker = DirtyTiles(16)
+    tracker.update(before)
+    mask = tracker.update(after)
+    assert mask[1, 1]
+    assert np.count_nonzero(mask) == 1
+
+
+def test_single_pixel_change():
+    before, after = _frame(), _frame()
+    after[40, 50] = (240, 200, 200)
+    tracker = DirtyTiles(16)
+    tracker.update(before)
+    mask = tracker.update(after)
+    assert mask[2, 3]
+    assert np.count_nonzero(mask) == 1
+    # The changed tile extended by one tile for the template margin
+    assert tracker.regions(4, 4) == [(32, 16, 64, 64)]
+
+
+def test_frame_reused_by_source_is_compared_with_copy():
+    frame = _frame()
+    tracker = DirtyTiles(16)
+    tracker.update(frame)
+    frame[0, 0] = 0  # Sources overwrite the grabbed frame in place
+    assert tracker.update(frame)[0, 0]
+
+
+def test_ragged_frame_edges():
+    before = np.full((50, 70, 3), 10, dtype=np.uint8)
+    after = before.copy()
+    after[49, 69] = 11
+    tracker = DirtyTiles(16)
+    tracker.update(before)
+    mask = tracker.update(after)
+    assert mask.shape == (4, 5)
+    assert mask[3, 4] and np.count_nonzero(mask) == 1
+
+
+def test_regions_are_plain_ints():
+    before, after = _frame(), _frame()
+    after[40, 50] = 0
+    tracker = DirtyTiles(16)
+    tracker.update(before)
+    tracker.update(after)
+    (region,) = tracker.regions(4, 4)
+    assert all(type(v) is int for v in region)
@@ -0,0 +1,232 @@
+import itertools
+from types import SimpleNamespace
+
+import pytest
+
+from deskapptest.apps.elements import CriteriaMatcher, ElementSnapshot, ElementTree
+
+_handles = itertools.count(100)
+
+
+class FakeElement:
+    def __init__(
+        self,
+        name,
+        control_type,
+        automation_id,
+        *children,
+        class_name=None,
+        windowless=False,
+    ):
+        handle = None if windowless else next(_handles)
+        self.element_info = SimpleNamespace(
+            name=name,
+            class_name=class_name or control_type,
+            control_type=control_type,
+            automation_id=automation_id,
+            handle=handle,
+            # UIAElementInfo.control_id is None without a handle
+            control_id=None if windowless else 1000 + handle,
+            framework_id="WPF" if windowless else "Win32",
+        )
+        self._children = list(children)
+        self.children_calls = 0
+
+    def children(self):
+        self.children_calls += 1
+        return self._children
+
+
+def _window(windowless=False):
+    return FakeElement(
+        "Save As",
+        "Window",
+        "SaveDialog",
+        FakeElement("File name:", "Edit", "FileNameBox", windowless=windowless),
+        FakeElement("Save", "Button", "SaveButton", windowless=windowless),
+        FakeElement("Cancel", "Button", "CancelButton", windowless=windowless),
+        FakeElement(
+            "Options",
+            "Pane",
+            "OptionsPane",
+            FakeElement("Hidden", "CheckBox", "Hide"),
+            windowless=windowless,
+        ),
+    )
+
+
+# Fields and defaults of windows.Criteria, asdict() of it was the baseline kwargs
+_CRITERIA_DEFAULTS = dict(
+    class_name=None,
+    class_name_re=None,
+    parent=None,
+    process=None,
+    title=None,
+    title_re=None,
+    top_level_only=True,
+    visible_only=True,
+    enabled_only=True,
+    best_match=None,
+    handle=None,
+    ctrl_index=None,
+    found_index=None,
+    predicate_func=None,
+    active_only=False,
+    control_id=None,
+    control_type=None,
+    auto_id=None,
+    framework_id=None,
+    depth=None,
+)
+
+
+def _baseline_best_match(name, window):
+    for v in window.element_info.__dict__.values():
+        try:
+            if name in v:
+                return window
+        except TypeError:  # v is not iterable issues
+            return None
+
+
+def _baseline_child(window, fields):
+    """
+    find_child of Window.child_from_wrapper before the snapshots, as is: every Criteria field including
+    the None ones, the first child with ANY equal element_info attribute, missing attributes are skipped
+    """
+    kwargs = {**_CRITERIA_DEFAULTS, **fields}
+    if "auto_id" in kwargs:
+        kwargs["automation_id"] = kwargs.pop("auto_id")
+    for child in window.children():
+        for k, v in kwargs.items():
+            try:
+                attr_val = getattr(child.element_info, k)
+            except AttributeError:
+                if k == "best_match":
+                    found_child = _baseline_best_match(v, child)
+                    if found_child:
+                        return child
+            else:
+                if attr_val == v:
+                    return child
+    return None
+
+
+def _matcher(**fields):
+    return CriteriaMatcher.compile(
+        tuple(
+            (k, v) for k, v in {**_CRITERIA_DEFAULTS, **fields}.items() if v is not None
+        )
+    )
+
+
+def _auto_id(element):
+    return element.element_info.automation_id if element is not None else None
+
+
+# fields, windowless children, baseline child, new child (automation ids)
+_LOOKUPS = [
+    # Single property of the windowed (Win32) children: the same child
+    ({"auto_id": "CancelButton"}, False, "CancelButton", "CancelButton"),
+    ({"control_type": "Edit"}, False, "FileNameBox", "FileNameBox"),
+    ({"class_name": "Pane"}, False, "OptionsPane", "OptionsPane"),
+    ({"auto_id": "Missing"}, False, None, None),
+    # The baseline matched ANY property, all the populated ones are matched now
+    (
+        {"control_type": "Button", "auto_id": "CancelButton"},
+        False,
+        "SaveButton",
+        "CancelButton",
+    ),
+    ({"control_type": "Edit", "auto_id": "Missing"}, False, "FileNameBox", None),
+    # title is not an element_info attribute, the baseline skipped it
+    ({"title": "Cancel"}, False, None, "CancelButton"),
+    # The None handle and control_id of the windowless (UIA) children matched the None criteria fields,
+    # so the baseline returned the first child for any criteria
+    ({"auto_id": "CancelButton"}, True, "FileNameBox", "CancelButton"),
+    ({"title": "Missing"}, True, "FileNameBox", None),
+]
+
+
+@pytest.mark.parametrize("fields, windowless, baseline, expected", _LOOKUPS)
+def test_lookup_semantics_against_baseline(fields, windowless, baseline, expected):
+    window = _window(windowless)
+    assert _auto_id(_baseline_child(window, fields)) == baseline
+    record = _matcher(**fields).first(ElementSnapshot(window))
+    assert _auto_id(record and record.wrapper) == expected
+
+
+def test_handle():
+    window = _window()
+    cancel = window.children()[2]
+    handle = cancel.element_info.handle
+    assert _matcher(handle=handle).first(ElementSnapshot(window)).wrapper is cancel
+    assert _baseline_child(window, {"handle": handle}) is cancel
+
+
+def test_find_all_and_regexes():
+    snapshot = ElementSnapshot(_window())
+    assert [
+        r.automation_id for r in _matcher(control_type="Button").find(snapshot)
+    ] == [
+        "SaveButton",
+        "CancelButton",
+    ]
+    assert [r.name for r in _matcher(title_re="^(Save|Cancel)$").find(snapshot)] == [
+        "Save",
+        "Cancel",
+    ]
+    assert _matcher(title="Save").first(snapshot).automation_id == "SaveButton"
+    assert _matcher(class_name_re="Check").first(snapshot) is None  # Depth 1
+
+
+def test_deeper_snapshot():
+    snapshot = ElementSnapshot(_window(), depth=2)
+    record = _matcher(auto_id="Hide").first(snapshot)
+    assert record.depth == 2
+
+
+@pytest.mark.parametrize(
+    "fields",
+    [
+        {"control_id": 1001},
+        {"framework_id": "Win32"},
+        {"process": 1234},
+        {"found_index": 1, "control_type": "Button"},
+        {"ctrl_index": 0},
+        {"predicate_func": lambda e: True},
+        {"depth": 2},
+        {"best_match": "Save"},
+    ],
+)
+def test_unsupported_fields_need_pywinauto_lookup(fields):
+    matcher = _matcher(**fields)
+    assert not matcher.in_process
+    with pytest.raises(AssertionError):
+        matcher.first(ElementSnapshot(_window()))
+
+
+def test_supported_fields_are_in_process():
+    assert _matcher(title="Save", auto_id="SaveButton", class_name_re="B.*").in_process
+
+
+def test_unhashable_criteria_compile():
+    matcher = _matcher(control_type=["Button", "Edit"])
+    assert matcher.kwargs["control_type"] == ["Button", "Edit"]
+    predicate = lambda e: True  # noqa: E731
+    assert _matcher(predicate_func=predicate).kwargs["predicate_func"] is predicate
+
+
+def test_compile_is_cached_for_hashable_criteria():
+    assert _matcher(auto_id="SaveButton") is _matcher(auto_id="SaveButton")
+
+
+def test_tree_snapshot_ttl_and_invalidate():
+    window = _window()
+    tree = ElementTree(window, depth=1, ttl_ms=60_000)
+    first = tree.snapshot()
+    assert tree.snapshot() is first
+    assert window.children_calls == 1
+    tree.invalidate()
+    assert tree.snapshot() is not first
+    assert window.children_calls == 2
@@ -0,0 +1,55 @@
+from types import SimpleNamespace
+
+import numpy as np
+
+from deskapptest.utils import frames
+
+
+class FakeMss:
+    def __init__(self, screen):
+        self.screen = screen  # BGRA
+        self.monitors = [None, {"left": 0, "top": 0, "width": 8, "height": 6}]
+        self.grabbed = []
+
+    def grab(self, monitor):
+        self.grabbed.append(monitor)
+        left, top = monitor["left"], monitor["top"]
+        pixels = self.screen[
+            top : top + monitor["height"], left : left + monitor["width"]
+        ]
+        return SimpleNamespace(
+            raw=bytearray(pixels.tobytes()),
+            width=monitor["width"],
+            height=monitor["height"],
+        )
+
+    def close(self):
+        pass
+
+
+def test_screen_size_without_grab(monkeypatch):
+    def mss():
+        raise AssertionError("The screen is grabbed")
+
+    monkeypatch.setattr(frames, "_mss", SimpleNamespace(mss=mss))
+    monkeypatch.setattr(frames, "pyautogui", SimpleNamespace(size=lambda: (3840, 2160)))
+    assert frames.ScreenSource().size() == (3840, 2160)
+
+
+def test_screen_grabs_region_into_reused_buffer(monkeypatch):
+    screen = np.random.default_rng(0).integers(0, 256, (6, 8, 4), dtype=np.uint8)
+    sct = FakeMss(screen)
+    monkeypatch.setattr(frames, "_mss", SimpleNamespace(mss=lambda: sct))
+    source = frames.ScreenSource()
+
+    full = source.grab()
+    assert (full == screen[..., :3]).all()
+    region = source.grab(frames.Rect(2, 1, 6, 4))
+    assert sct.grabbed[-1] == {"left": 2, "top": 1, "width": 4, "height": 3}
+    assert (region == screen[1:4, 2:6, :3]).all()
+
+    # The same size grab is written into the previous frame
+    buffer = region
+    screen[...] = 255 - screen
+    assert source.grab(frames.Rect(2, 1, 6, 4)) is buffer
+    assert (buffer == screen[1:4, 2:6, :3]).all()
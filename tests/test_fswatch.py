@@ -0,0 +1,36 @@
+import os
+import sys
+
+import pytest
+
+from deskapptest.utils import fswatch
+
+pytestmark = pytest.mark.skipif(
+    not sys.platform.startswith("linux"), reason="inotify is Linux only"
+)
+
+
+def test_wakes_up_on_created_file(tmp_path):
+    with fswatch.watch(tmp_path, backend=fswatch.INOTIFY) as watcher:
+        assert not watcher.wait(0.01)
+        (tmp_path / "done.txt").write_text("ok")
+        assert watcher.wait(5)
+        assert not watcher.wait(0.01)  # Events are drained
+
+
+def test_descriptor_above_select_limit(tmp_path):
+    # select() rejects descriptors >= FD_SETSIZE, take the low ones so inotify gets a high one
+    taken = []
+    try:
+        while not taken or taken[-1] < 1100:
+            taken.append(os.open(os.devnull, os.O_RDONLY))
+    except OSError:
+        pytest.skip("Not enough file descriptors")
+    try:
+        with fswatch.InotifyWatcher(tmp_path) as watcher:
+            assert watcher._fd >= 1024
+            (tmp_path / "done.txt").write_text("ok")
+            assert watcher.wait(5)
+    finally:
+        for fd in taken:
+            os.close(fd)
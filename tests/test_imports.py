@@ -0,0 +1,16 @@
+import os
+import subprocess
+import sys
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_import_does_not_parse_configuration():
+    code = (
+        "from deskapptest.utils import conf\n"
+        "import deskapptest.apps.base, deskapptest.utils.metrics, deskapptest.utils.wait\n"
+        "assert conf._toml is None, 'configuration is parsed on import'\n"
+        "from deskapptest.utils.wait import TimeoutMs\n"
+        "assert TimeoutMs.mid > 0 and conf._toml is not None\n"
+    )
+    subprocess.run([sys.executable, "-c", code], cwd=_ROOT, check=True)
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+from deskapptest.utils import dirty, matching, tplcache
+from deskapptest.utils.backends import settings as _settings
+
+
+@pytest.fixture
+def changed(tmp_path):
+    import cv2
+    from airtest.core.cv import Template
+
+    rnd = np.random.default_rng(0)
+    screen = rnd.integers(0, 255, (200, 300, 3), dtype=np.uint8)
+    path = str(tmp_path / "tpl.png")
+    cv2.imwrite(path, screen[50:80, 60:100])
+    tracker = dirty.DirtyTiles(16)
+    tracker.update(screen)
+    after = screen.copy()
+    after[150, 250] = 0
+    tracker.update(after)
+    Settings = _settings.Settings
+    prev = Settings.CVSTRATEGY
+    yield Template(path), after, tracker
+    Settings.CVSTRATEGY = prev
+    tplcache.get_cache().clear()
+
+
+@pytest.mark.parametrize("strategy", [["tpl"], ["pyramid"], ["tpl", "pyramid"]])
+def test_changed_areas_are_cropped(changed, strategy):
+    template, screen, tracker = changed
+    _settings.Settings.CVSTRATEGY = strategy
+    regions = matching._changed_regions(template, screen, (300, 200), tracker)
+    assert regions and all(r.width < 300 for r in regions)
+
+
+@pytest.mark.parametrize("strategy", [["sift"], ["mstpl"], ["tpl", "brisk"]])
+def test_other_strategies_search_whole_frame(changed, strategy):
+    template, screen, tracker = changed
+    _settings.Settings.CVSTRATEGY = strategy
+    assert matching._changed_regions(template, screen, (300, 200), tracker) is None
+
+
+def test_pyramid_strategy_registered_for_airtest(changed):
+    from airtest.core.cv import MATCHING_METHODS
+
+    from deskapptest.utils import backends
+
+    MATCHING_METHODS.pop("pyramid", None)
+    backends.settings.reconfigure()
+    template, screen, _ = changed
+    _settings.Settings.CVSTRATEGY = ["pyramid"]
+    assert template._cv_match(screen)["result"] == (80, 65)
+
+
+def test_find_many_and_any_in_given_source(changed, monkeypatch):
+    from deskapptest.apps import base
+    from deskapptest.utils import frames
+
+    def get_source():
+        raise AssertionError("The default source is used")
+
+    monkeypatch.setattr(frames, "get_source", get_source)
+    template, screen, _ = changed
+    source = frames.ArraySource(screen)
+    assert base.find_many([template], wait_ms=0, source=source) == {template: (80, 65)}
+    assert base.find_any([template], wait_ms=0, source=source) == (template, (80, 65))
@@ -0,0 +1,98 @@
+import os
+import subprocess
+import sys
+import uuid
+
+import psutil
+import pytest
+
+from deskapptest.utils import proc
+
+pytestmark = pytest.mark.skipif(
+    not sys.platform.startswith("linux"), reason="Named stand-in apps use symlinks"
+)
+
+_SLEEP = "import time; time.sleep(60)"
+
+
+@pytest.fixture
+def app_exe(tmp_path):
+    """
+    Python under a unique name, so only the test processes are killed by name
+    """
+    name = "dat" + uuid.uuid4().hex[:8]
+    path = tmp_path / name
+    os.symlink(sys.executable, path)
+    return name, str(path)
+
+
+def _spawn(exe, code=_SLEEP):
+    return subprocess.Popen([exe, "-c", code], stdout=subprocess.PIPE, text=True)
+
+
+def test_kill_procs_by_name(app_exe):
+    name, exe = app_exe
+    apps = [_spawn(exe), _spawn(exe)]
+    try:
+        snapshot_pids = {p.pid for p in proc.ProcSnapshot.take().by_name(name)}
+        assert snapshot_pids == {a.pid for a in apps}
+        report = proc.kill_procs([name], timeout=10)
+        assert {p.pid for p in report.gone} == snapshot_pids
+        assert not report.alive
+        assert set(report.exit_ms) == snapshot_pids
+        assert all(ms >= 0 for ms in report.exit_ms.values())
+        assert not proc.get_procs(name)
+    finally:
+        for a in apps:
+            a.kill()
+            a.wait()
+
+
+def test_kill_proctree_exit_report():
+    # The parent starts a sleeping child and a child which exits by itself
+    code = (
+        "import subprocess, sys, time\n"
+        f"sleeping = subprocess.Popen([sys.executable, '-c', {_SLEEP!r}])\n"
+        "exiting = subprocess.Popen([sys.executable, '-c', 'pass'])\n"
+        "print(sleeping.pid, exiting.pid, flush=True)\n"
+        "exiting.wait()\n"
+        "print('exited', flush=True)\n"
+        "time.sleep(60)\n"
+    )
+    parent = _spawn(sys.executable, code)
+    try:
+        sleeping, exiting = map(int, parent.stdout.readline().split())
+        assert parent.stdout.readline().strip() == "exited"
+        terminated = []
+        gone, alive = proc.kill_proctree(
+            parent.pid, timeout=10, on_terminate=terminated.append
+        )
+        # The gracefully exited child is not in the tree anymore, the rest is killed
+        assert {p.pid for p in gone} == {parent.pid, sleeping}
+        assert exiting not in {p.pid for p in gone}
+        assert not alive
+        assert {p.pid for p in terminated} == {parent.pid, sleeping}
+        assert not psutil.pid_exists(sleeping)
+    finally:
+        parent.kill()
+        parent.wait()
+
+
+def test_exit_report_gone_killed_and_survivors(monkeypatch):
+    exiting = _spawn(sys.executable, "pass")
+    killed = _spawn(sys.executable)
+    survivor = _spawn(sys.executable)
+    # Taken as by a snapshot, the first process exits by itself before the kill
+    procs = [psutil.Process(p.pid) for p in (exiting, killed, survivor)]
+    exiting.wait()
+    # The OS denies killing the survivor
+    monkeypatch.setattr(procs[2], "kill", lambda: None)
+    try:
+        report = proc._kill_and_wait(procs, 0.5, None)
+        assert {p.pid for p in report.gone} == {exiting.pid, killed.pid}
+        assert [p.pid for p in report.alive] == [survivor.pid]
+        assert set(report.exit_ms) == {exiting.pid, killed.pid}
+    finally:
+        for p in (killed, survivor):
+            p.kill()
+            p.wait()
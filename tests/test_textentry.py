@@ -0,0 +1,51 @@
+import pytest
+
+from deskapptest.utils import textentry
+
+_LONG = "x" * 100
+
+
+@pytest.fixture
+def clipboard(monkeypatch):
+    board = {"formats": {8: b"image", 49161: b"{\\rtf1}"}}
+    monkeypatch.setattr(textentry, "save_clipboard", lambda: dict(board["formats"]))
+    monkeypatch.setattr(
+        textentry, "restore_clipboard", lambda saved: board.update(formats=saved)
+    )
+    monkeypatch.setattr(
+        textentry, "copy_text", lambda text: board.update(formats={13: text})
+    )
+    return board
+
+
+def test_paste_restores_all_formats(clipboard):
+    value = []
+    textentry.paste(
+        _LONG,
+        lambda: value.append(clipboard["formats"][13]),
+        read_back=lambda: "".join(value),
+    )
+    assert clipboard["formats"] == {8: b"image", 49161: b"{\\rtf1}"}
+
+
+def test_paste_not_landed_raises_and_restores(clipboard):
+    with pytest.raises(AssertionError):
+        textentry.paste(_LONG, lambda: None, read_back=lambda: "unchanged")
+    assert 13 not in clipboard["formats"]
+
+
+def test_paste_empty_clipboard_is_cleared(clipboard):
+    clipboard["formats"] = {}
+    textentry.paste(_LONG, lambda: None, read_back=lambda: None)  # Not exposed
+    assert clipboard["formats"] == {}
+
+
+def test_paste_read_back_line_endings(clipboard):
+    textentry.paste("a\nb" * 40, lambda: None, read_back=lambda: "a\r\nb" * 40)
+
+
+def test_key_syntax_only_for_type_keys():
+    text = "{ENTER}" + _LONG
+    assert textentry.choose(text, "auto") == textentry.PASTE
+    assert textentry.choose(text, "auto", key_syntax=True) == textentry.TYPE
+    assert textentry.choose("short", "auto") == textentry.TYPE
@@ -0,0 +1,99 @@
+import asyncio
+
+import pytest
+
+from deskapptest.utils import wait
+
+
+async def _after(delay: float, value=None, error: Exception = None):
+    await asyncio.sleep(delay)
+    if error:
+        raise error
+    return value
+
+
+def test_first_of_returns_first_truthy():
+    assert asyncio.run(wait.first_of(_after(0.05, "slow"), _after(0.01, "fast"))) == (
+        1,
+        "fast",
+    )
+
+
+def test_first_of_raised_waiter_is_failed_branch():
+    index, value = asyncio.run(
+        wait.first_of(_after(0.01, error=TimeoutError("not found")), _after(0.05, 42))
+    )
+    assert (index, value) == (1, 42)
+
+
+def test_first_of_no_success():
+    assert asyncio.run(
+        wait.first_of(_after(0.01, error=TimeoutError()), _after(0.02, None))
+    ) == (None, None)
+
+
+def test_first_of_all_raised():
+    with pytest.raises(TimeoutError):
+        asyncio.run(
+            wait.first_of(
+                _after(0.01, error=TimeoutError()), _after(0.02, error=ValueError())
+            )
+        )
+
+
+def test_early_wake_keeps_backoff_interval():
+    now = [0.0]
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        now[0] += seconds / 10
+        return True  # Woken up by a change
+
+    result = wait.wait_until(
+        lambda: len(sleeps) >= 4,
+        wait_ms=10_000,
+        policy=wait.WaitPolicy(100, backoff=2, max_retry_ms=1000),
+        sleep=sleep,
+        clock=lambda: now[0],
+    )
+    assert result
+    assert sleeps == [0.1] * 4
+
+
+def test_full_sleep_advances_backoff():
+    now = [0.0]
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        now[0] += seconds
+
+    wait.wait_until(
+        lambda: len(sleeps) >= 4,
+        wait_ms=10_000,
+        policy=wait.WaitPolicy(100, backoff=2, max_retry_ms=500),
+        sleep=sleep,
+        clock=lambda: now[0],
+    )
+    assert sleeps == [0.1, 0.2, 0.4, 0.5]
+
+
+class _Falsy:
+    def __bool__(self):
+        return False
+
+
+def test_result_success_is_not_reevaluated():
+    values = iter([0, [1]])
+    result = wait.wait_until(
+        lambda: next(values), wait_ms=1000, policy=wait.WaitPolicy(0)
+    )
+    assert result.success and result and result.attempts == 2
+    result.value.clear()  # The value may change after the wait
+    assert result
+
+
+def test_result_failure():
+    result = wait.wait_until(_Falsy, wait_ms=0, policy=wait.WaitPolicy(0))
+    assert not result.success and not result and result.attempts == 1